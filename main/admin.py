@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Service, ServiceRequest
+from django.db.models import Prefetch
+from .models import User, Service, ServiceRequest, ServiceDailyDemand, NotificationOutbox
+from .pagination import EstimatedCountPaginator
 
 # Register your models here.
 
@@ -33,14 +35,26 @@ class ServiceAdmin(admin.ModelAdmin):
 @admin.register(ServiceRequest)
 class ServiceRequestAdmin(admin.ModelAdmin):
     list_display = ('get_username', 'get_service_title', 'service_day', 'created_at')
-    search_fields = ('user__full_name', 'service__title', 'location')
+    # Prefix searches so the name/phone/title indexes can be used
+    search_fields = ('^user__full_name', '^user__phone_number', '^phone_number', '^services__title_ar', '^services__title')
+    date_hierarchy = 'created_at'
     list_filter = ('created_at',)
     ordering = ('-created_at',)
     readonly_fields = ('display_requested_services',)  # Add this line
+    raw_id_fields = ('user',)
+    list_select_related = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('services', queryset=Service.objects.only('id', 'title_ar'))
+        )
 
     def get_username(self, obj):
         return obj.user.full_name
     get_username.short_description = 'Full Name'
+    get_username.admin_order_field = 'user__full_name'
 
     def get_service_title(self, obj):
         return ", ".join([service.title_ar for service in obj.services.all()])
@@ -49,3 +63,20 @@ class ServiceRequestAdmin(admin.ModelAdmin):
     def display_requested_services(self, obj):
         return ", ".join([service.title_ar for service in obj.services.all()])
     display_requested_services.short_description = 'Requested Services'
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    ordering = ('-id',)
+    raw_id_fields = ('service_request',)
+
+
+@admin.register(ServiceDailyDemand)
+class ServiceDailyDemandAdmin(admin.ModelAdmin):
+    list_display = ('date', 'service', 'orders', 'distinct_users')
+    list_filter = ('service',)
+    list_select_related = ('service',)
+    date_hierarchy = 'date'
+    ordering = ('-date', 'service')
@@ -0,0 +1,186 @@
+"""
+Native async (ASGI) versions of the read endpoints and order creation.
+
+They return the same envelopes as the DRF views in ``views.py`` but run
+on the event loop, so a process can hold many slow mobile connections
+open. DB access goes through Django's async ORM, or ``sync_to_async``
+where a step (catalog cache, serializer validation, transactions) only
+exists in sync form.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import patch_cache_control
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from rest_framework.authtoken.models import Token
+
+from .authentication import get_token_cache
+from .catalog import (
+    get_catalog_last_modified, get_service_detail_data, get_service_list_page, service_detail_key,
+    service_list_key,
+)
+from .conditional import history_validators, make_etag, not_modified, set_validators
+from .idempotency import IdempotencyError, arun_idempotent
+from .instrumentation import timed
+from .models import ServiceRequest
+from .orders import create_service_request as create_one_service_request
+from .renderers import dumps
+from .pagination import InvalidCursor, get_page_size, keyset_page, keyset_queryset
+from .serializers import (
+    InvalidFieldset, ServiceDetailSerializer, ServiceListSerializer, ServiceRequestSerializer,
+)
+from .throttling import OrderThrottle, throttled_response
+from .views import get_fieldset, get_image_width, get_language
+
+NOT_AUTHENTICATED = {"detail": "Authentication credentials were not provided."}
+INVALID_TOKEN = {"detail": "Invalid token."}
+
+
+def envelope(payload, status=200, cache_key=None):
+    response = HttpResponse(dumps(payload), status=status, content_type='application/json')
+    if cache_key:
+        response.compress_cache_key = cache_key
+    return response
+
+
+async def aauthenticate(request):
+    """
+    Async counterpart of CachedTokenAuthentication. Returns the user, or
+    the error response to send back.
+    """
+    parts = request.headers.get('Authorization', '').split()
+    if len(parts) != 2 or parts[0].lower() != 'token':
+        return None, JsonResponse(NOT_AUTHENTICATED, status=401)
+    key = parts[1]
+    cache = get_token_cache()
+    user = cache.get(key)
+    if user is None:
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            return None, JsonResponse(INVALID_TOKEN, status=401)
+        user = token.user
+        cache.set(key, user)
+    if not user.is_active:
+        return None, JsonResponse({"detail": "User inactive or deleted."}, status=401)
+    return user, None
+
+
+async def service_list(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    cursor = request.GET.get('cursor')
+    try:
+        fields, omit = get_fieldset(request, ServiceListSerializer)
+    except InvalidFieldset as e:
+        return envelope({"status": False, "message": str(e), "data": []}, status=400)
+    params = (get_language(request), cursor, get_page_size(request), get_image_width(request), fields, omit)
+    key = await sync_to_async(service_list_key)(*params)
+    last_modified = await sync_to_async(get_catalog_last_modified)()
+    cached = not_modified(request, make_etag(key), last_modified)
+    if cached:
+        return cached
+    try:
+        page = await sync_to_async(get_service_list_page)(*params)
+    except InvalidCursor:
+        return envelope({"status": False, "message": "Invalid cursor", "data": []}, status=400)
+    data = page['data']
+    if not data and not cursor:
+        return envelope({"status": False, "message": "No services found", "data": []}, status=404)
+    response = envelope({"status": True, "message": f"Successfully retrieved {len(data)} services", "data": data,
+                         "pagination": {"next": page['next'], "previous": page['previous']}},
+                        cache_key=page['cache_key'])
+    return set_validators(response, make_etag(page['cache_key']), last_modified)
+
+
+async def service_detail(request, service_id):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        fields, omit = get_fieldset(request, ServiceDetailSerializer)
+    except InvalidFieldset as e:
+        return envelope({"status": False, "message": str(e), "data": None}, status=400)
+    params = (service_id, get_language(request), get_image_width(request), fields, omit)
+    key = await sync_to_async(service_detail_key)(*params)
+    last_modified = await sync_to_async(get_catalog_last_modified)()
+    cached = not_modified(request, make_etag(key), last_modified)
+    if cached:
+        return cached
+    data, cache_key = await sync_to_async(get_service_detail_data)(*params)
+    if data is None:
+        return envelope({"status": False, "message": f"Service with ID {service_id} not found", "data": None}, status=404)
+    response = envelope({"status": True, "message": f"Successfully retrieved service with ID {service_id}",
+                         "data": data}, cache_key=cache_key)
+    return set_validators(response, make_etag(cache_key), last_modified)
+
+
+async def list_service_requests(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    user, error = await aauthenticate(request)
+    if error:
+        return error
+    language = get_language(request)
+    cursor = request.GET.get('cursor')
+    page_size = get_page_size(request)
+    try:
+        fields, omit = get_fieldset(request, ServiceRequestSerializer)
+    except InvalidFieldset as e:
+        return envelope({"status": False, "message": str(e), "data": []}, status=400)
+    etag, last_modified = await sync_to_async(history_validators)(
+        user, language, cursor, page_size, sorted(fields or ()), sorted(omit or ()))
+    cached = not_modified(request, etag, last_modified)
+    if cached:
+        return cached
+    qs = ServiceRequestSerializer.setup_eager_loading(
+        ServiceRequest.objects.filter(user=user), language, fields, omit)
+    try:
+        qs, reverse = keyset_queryset(qs, cursor, page_size)
+    except InvalidCursor:
+        return envelope({"status": False, "message": "Invalid cursor", "data": []}, status=400)
+    requests_list, next_cursor, previous_cursor = keyset_page(
+        [obj async for obj in qs], page_size, reverse, cursor)
+    if not requests_list and not cursor:
+        return envelope({"status": False, "message": "No service requests found", "data": []}, status=404)
+    with timed('serialize'):
+        # users and services are already loaded, so this doesn't touch the DB
+        data = ServiceRequestSerializer(requests_list, many=True, context={
+            'language': language, 'fields': fields, 'omit': omit}).data
+    response = envelope({"status": True, "message": f"Successfully retrieved {len(requests_list)} service requests",
+                         "data": data, "pagination": {"next": next_cursor, "previous": previous_cursor}})
+    patch_cache_control(response, private=True, no_cache=True)
+    return set_validators(response, etag, last_modified)
+
+
+async def create_service_request(request):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    user, error = await aauthenticate(request)
+    if error:
+        return error
+    request.user = user
+    throttle = OrderThrottle()
+    if not await sync_to_async(throttle.allow_request)(request, None):
+        return throttled_response(throttle.wait())
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError as e:
+        return JsonResponse({"detail": f"JSON parse error - {e}"}, status=400)
+    language = get_language(request)
+    try:
+        body, status, replayed = await arun_idempotent(
+            user, request.headers.get('Idempotency-Key'), payload,
+            lambda record: create_one_service_request(user, payload, language, record))
+    except IdempotencyError as e:
+        response = envelope({"status": False, "message": str(e), "data": None}, status=e.status_code)
+        for header, value in e.headers.items():
+            response[header] = value
+        return response
+    response = envelope(body, status=status)
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+# Token authentication only; there is no session cookie to protect
+create_service_request.csrf_exempt = True
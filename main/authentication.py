@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class LRUCache:
+    """Small thread-safe LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SharedCache:
+    """Adapter over a Django cache alias so every worker sees the same entries."""
+
+    def __init__(self, alias, ttl):
+        self.alias = alias
+        self.ttl = ttl
+
+    def _key(self, key):
+        return f'auth:token:{key}'
+
+    def get(self, key):
+        return caches[self.alias].get(self._key(key))
+
+    def set(self, key, value):
+        caches[self.alias].set(self._key(key), value, self.ttl)
+
+    def delete(self, key):
+        caches[self.alias].delete(self._key(key))
+
+    def clear(self):
+        pass
+
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    global _token_cache
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                ttl = getattr(settings, 'TOKEN_AUTH_CACHE_TTL', 300)
+                alias = getattr(settings, 'TOKEN_AUTH_CACHE_ALIAS', None)
+                if alias:
+                    _token_cache = SharedCache(alias, ttl)
+                else:
+                    _token_cache = LRUCache(getattr(settings, 'TOKEN_AUTH_CACHE_SIZE', 10000), ttl)
+    return _token_cache
+
+
+def invalidate_token(key):
+    get_token_cache().delete(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for DRF's TokenAuthentication that remembers
+    token key -> user so authenticated requests skip the Token/User join.
+    Entries are dropped when the token is deleted or the user is saved.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        user = cache.get(key)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(key, user)
+            return user, token
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return user, Token(key=key, user=user)
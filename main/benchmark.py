@@ -0,0 +1,281 @@
+"""
+Endpoint benchmark harness used by ``manage.py bench_api``.
+
+Runs every API route in-process against a throwaway test database,
+with Telegram disabled, and reports latency percentiles, throughput and
+query counts per scenario.
+"""
+import asyncio
+import itertools
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, connections
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from django.test import AsyncClient
+from rest_framework.test import APIClient
+
+from .hashers import make_phone_credential
+from .models import Service, ServiceRequest, User
+
+SCENARIOS = (
+    'services_list_en', 'services_list_ar', 'service_detail_en', 'service_detail_ar',
+    'register', 'login', 'create', 'batch', 'history', 'logout',
+)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def use_file_test_database():
+    """SQLite's shared in-memory test DB locks under concurrent writes; use a temp file."""
+    if connection.vendor == 'sqlite':
+        path = os.path.join(tempfile.mkdtemp(prefix='sham-bench-'), 'bench.sqlite3')
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = path
+
+
+class Dataset:
+    """Seeds services, users (with tokens) and order history."""
+
+    def __init__(self, services, users, orders_per_user, seed=0):
+        self.random = random.Random(seed)
+        self.service_count = services
+        self.user_count = users
+        self.orders_per_user = orders_per_user
+
+    def build(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1024, 768), 'orange').save(buffer, 'JPEG')
+        image_name = default_storage.save('services/bench.jpg', ContentFile(buffer.getvalue()))
+
+        Service.objects.bulk_create([
+            Service(
+                title=f'Service {i}', title_ar=f'خدمة {i}',
+                description=f'Description {i}', description_ar=f'وصف {i}',
+                price=f'{i}$', price_ar=f'{i} ل.س', image=image_name,
+                details=f'Details {i}', details_ar=f'تفاصيل {i}',
+            )
+            for i in range(self.service_count)
+        ])
+        self.service_ids = list(Service.objects.values_list('id', flat=True))
+
+        users = [
+            User(full_name=f'bench-user-{i}', phone_number=f'+9639{i:08d}')
+            for i in range(self.user_count)
+        ]
+        for user in users:
+            user.password = make_phone_credential(user.phone_number)
+        User.objects.bulk_create(users)
+        self.users = list(User.objects.filter(full_name__startswith='bench-user-').order_by('id'))
+        Token.objects.bulk_create([Token(key=Token.generate_key(), user=user) for user in self.users])
+        self.tokens = dict(Token.objects.values_list('user_id', 'key'))
+
+        orders = [
+            ServiceRequest(
+                user=user, phone_number=user.phone_number, address='Damascus', service_day='Monday',
+            )
+            for user in self.users for _ in range(self.orders_per_user)
+        ]
+        ServiceRequest.objects.bulk_create(orders, batch_size=1000)
+        Through = ServiceRequest.services.through
+        links = [
+            Through(servicerequest_id=pk, service_id=service_id)
+            for pk in ServiceRequest.objects.values_list('id', flat=True)
+            for service_id in self.random.sample(self.service_ids, min(3, len(self.service_ids)))
+        ]
+        Through.objects.bulk_create(links, batch_size=1000)
+
+    def order_payload(self):
+        count = self.random.randint(1, min(4, len(self.service_ids)))
+        return {'services': self.random.sample(self.service_ids, count), 'phone_number': '+963900000000',
+                'address': 'Damascus', 'service_day': 'Monday'}
+
+
+class Runner:
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        # users handed out to logout, one each so every logout has a live token
+        self._logout_users = iter(dataset.users)
+
+    def next_id(self):
+        with self._lock:
+            return next(self._counter)
+
+    def authed_client(self, user=None):
+        user = user or self.dataset.users[self.next_id() % len(self.dataset.users)]
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.dataset.tokens[user.id]}')
+        return client
+
+    def request(self, scenario):
+        ds = self.dataset
+        client = APIClient()
+        service_id = ds.service_ids[self.next_id() % len(ds.service_ids)]
+        if scenario == 'services_list_en':
+            return client.get('/api/services/')
+        if scenario == 'services_list_ar':
+            return client.get('/api/services/', HTTP_ACCEPT_LANGUAGE='ar')
+        if scenario == 'service_detail_en':
+            return client.get(f'/api/services/{service_id}/')
+        if scenario == 'service_detail_ar':
+            return client.get(f'/api/services/{service_id}/', HTTP_ACCEPT_LANGUAGE='ar')
+        if scenario == 'register':
+            n = self.next_id()
+            return client.post('/api/register/', {'full_name': f'bench-new-{n}', 'phone_number': f'+9638{n:08d}'})
+        if scenario == 'login':
+            user = ds.users[self.next_id() % len(ds.users)]
+            response = client.post('/api/login/', {'full_name': user.full_name, 'phone_number': user.phone_number})
+            if response.status_code == 200:
+                # login may rotate the token the other scenarios use
+                ds.tokens[user.id] = response.json()['data']['token']
+            return response
+        if scenario == 'create':
+            return self.authed_client().post('/api/service-request/create/', ds.order_payload(), format='json')
+        if scenario == 'batch':
+            return self.authed_client().post(
+                '/api/service-request/batch/', [ds.order_payload() for _ in range(10)], format='json')
+        if scenario == 'history':
+            return self.authed_client().get('/api/service-requests/')
+        if scenario == 'logout':
+            with self._lock:
+                user = next(self._logout_users, None)
+            if user is None:
+                return None
+            return self.authed_client(user).post('/api/logout/')
+        raise ValueError(f'Unknown scenario {scenario!r}')
+
+    def run(self, scenario, requests, concurrency):
+        def one(_):
+            start = time.perf_counter()
+            response = self.request(scenario)
+            elapsed = time.perf_counter() - start
+            return response, elapsed
+
+        def worker(count):
+            results = [one(i) for i in range(count)]
+            connections.close_all()
+            return results
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            batches = list(pool.map(worker, split(requests, concurrency)))
+        wall = time.perf_counter() - start
+        return summarize(scenario, concurrency, itertools.chain.from_iterable(batches), wall)
+
+
+def split(requests, workers):
+    return [requests // workers + (1 if i < requests % workers else 0) for i in range(workers)]
+
+
+def summarize(scenario, concurrency, timed_responses, wall):
+    latencies, queries, errors = [], [], 0
+    for response, elapsed in timed_responses:
+        if response is None:
+            continue
+        latencies.append(elapsed * 1000)
+        if response.status_code >= 400:
+            errors += 1
+        if response.has_header('X-Query-Count'):
+            queries.append(int(response['X-Query-Count']))
+
+    return {
+        'scenario': scenario,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / wall, 1) if wall else None,
+        'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+        'mean_ms': round(statistics.fmean(latencies), 2) if latencies else None,
+        'queries_mean': round(statistics.fmean(queries), 2) if queries else None,
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+class AsyncRunner:
+    """Drives the async views in ``async_views.py`` through Django's ASGI handler."""
+
+    PATHS = {
+        'services_list_en': '/api/async/services/',
+        'history': '/api/async/service-requests/',
+        'create': '/api/async/service-request/create/',
+    }
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self._counter = itertools.count()
+
+    async def request(self, client, scenario):
+        ds = self.dataset
+        n = next(self._counter)
+        user = ds.users[n % len(ds.users)]
+        auth = {'Authorization': f'Token {ds.tokens[user.id]}'}
+        if scenario == 'services_list_en':
+            return await client.get(self.PATHS[scenario])
+        if scenario == 'service_detail_en':
+            return await client.get(f'/api/async/services/{ds.service_ids[n % len(ds.service_ids)]}/')
+        if scenario == 'history':
+            return await client.get(self.PATHS[scenario], headers=auth)
+        if scenario == 'create':
+            return await client.post(self.PATHS[scenario], ds.order_payload(),
+                                     content_type='application/json', headers=auth)
+        raise ValueError(f'No async version of scenario {scenario!r}')
+
+    def run(self, scenario, requests, concurrency):
+        async def worker(count):
+            client = AsyncClient()
+            results = []
+            for _ in range(count):
+                start = time.perf_counter()
+                response = await self.request(client, scenario)
+                results.append((response, time.perf_counter() - start))
+            return results
+
+        async def main():
+            return await asyncio.gather(*(worker(count) for count in split(requests, concurrency)))
+
+        start = time.perf_counter()
+        batches = asyncio.run(main())
+        wall = time.perf_counter() - start
+        return summarize(scenario, concurrency, itertools.chain.from_iterable(batches), wall)
+
+
+def environment():
+    return {
+        'git_revision': git_revision(),
+        'timestamp': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+    }
@@ -0,0 +1,127 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .instrumentation import timed
+from .models import Service
+from .pagination import paginate_keyset
+from .serializers import ServiceDetailSerializer, ServiceListSerializer
+
+VERSION_KEY = 'catalog:version'
+MODIFIED_KEY = 'catalog:modified'
+
+
+def get_catalog_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    # The version key expires too: a worker whose cache missed an
+    # invalidation (per-process cache) then reseeds it and renders afresh
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def _version(cache):
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a lost version key never resurrects old entries
+        cache.add(VERSION_KEY, int(time.time()), _timeout())
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_catalog_version():
+    """Current catalog version; it changes whenever a Service is saved or deleted."""
+    return _version(get_catalog_cache())
+
+
+def get_catalog_last_modified():
+    """Unix time of the last catalog change (now, if the cache lost it)"""
+    cache = get_catalog_cache()
+    modified = cache.get(MODIFIED_KEY)
+    if modified is None:
+        cache.add(MODIFIED_KEY, time.time(), _timeout())
+        modified = cache.get(MODIFIED_KEY)
+    return modified
+
+
+def _fieldset_key(fields, omit):
+    return f'{",".join(sorted(fields or ()))}:{",".join(sorted(omit or ()))}'
+
+
+def service_list_key(language, cursor=None, page_size=50, image_width=None, fields=None, omit=None):
+    """Versioned cache key of a service list page; it doubles as the page's ETag source"""
+    return (f'catalog:{get_catalog_version()}:list:{language}:{image_width}:{page_size}:{cursor or ""}'
+            f':{_fieldset_key(fields, omit)}')
+
+
+def service_detail_key(service_id, language, image_width=None, fields=None, omit=None):
+    return (f'catalog:{get_catalog_version()}:detail:{service_id}:{language}:{image_width}'
+            f':{_fieldset_key(fields, omit)}')
+
+
+def get_service_list_page(language, cursor=None, page_size=50, image_width=None, fields=None, omit=None):
+    """
+    Return ``{"data", "next", "previous", "cache_key"}`` for one page of
+    the rendered service list in ``language``, building and caching it on
+    a miss. ``cache_key`` identifies this exact payload (it changes with
+    the catalog version). ``fields``/``omit`` are cleaned sparse fieldsets;
+    only the columns they need are selected. Raises ``InvalidCursor`` for
+    a malformed cursor.
+    """
+    cache = get_catalog_cache()
+    key = service_list_key(language, cursor, page_size, image_width, fields, omit)
+    page = cache.get(key)
+    if page is None:
+        context = {'language': language, 'image_width': image_width, 'fields': fields, 'omit': omit}
+        # created_at is always loaded: the keyset cursors are built from it
+        columns = ServiceListSerializer.get_columns(context) | {'created_at'}
+        services, next_cursor, previous_cursor = paginate_keyset(
+            Service.objects.only(*columns), cursor, page_size)
+        with timed('serialize'):
+            data = ServiceListSerializer(services, many=True, context=context).data
+        page = {
+            'data': [dict(item) for item in data],
+            'next': next_cursor,
+            'previous': previous_cursor,
+            'cache_key': key,
+        }
+        cache.set(key, page, _timeout())
+    return page
+
+
+def get_service_detail_data(service_id, language, image_width=None, fields=None, omit=None):
+    """
+    Return ``(data, cache_key)``: the rendered service detail for
+    ``language`` (``None`` when the service does not exist) and the key
+    identifying that payload. Misses for unknown IDs are not cached.
+    """
+    cache = get_catalog_cache()
+    key = service_detail_key(service_id, language, image_width, fields, omit)
+    data = cache.get(key)
+    if data is None:
+        context = {'language': language, 'image_width': image_width, 'fields': fields, 'omit': omit}
+        columns = ServiceDetailSerializer.get_columns(context)
+        service = Service.objects.only(*columns).filter(id=service_id).first()
+        if service is None:
+            return None, key
+        with timed('serialize'):
+            data = dict(ServiceDetailSerializer(service, context=context).data)
+        cache.set(key, data, _timeout())
+    return data, key
+
+
+def invalidate_catalog(service_id=None):
+    """
+    Retire every cached catalog entry by bumping the catalog version.
+    Old entries are left for the cache to evict. Returns the new version.
+    """
+    cache = get_catalog_cache()
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        version = int(time.time())
+        cache.set(VERSION_KEY, version, _timeout())
+    cache.set(MODIFIED_KEY, time.time(), _timeout())
+    return version
@@ -0,0 +1,92 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .catalog import get_catalog_cache
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+COMPRESSIBLE_TYPES = re.compile(r'^(text/|application/(json|javascript|xml)|image/svg\+xml)')
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def choose_encoding(request):
+    accepted = _accepted_encodings(request)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=getattr(settings, 'BROTLI_QUALITY', 5))
+    return gzip.compress(content, compresslevel=getattr(settings, 'GZIP_LEVEL', 6), mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with brotli (when installed) or gzip according to
+    Accept-Encoding. Responses that set ``compress_cache_key`` (catalog
+    responses) have their compressed bytes cached under that key, so the
+    same payload is compressed once per encoding.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or len(response.content) < getattr(settings, 'COMPRESS_MIN_SIZE', 512)
+            or not COMPRESSIBLE_TYPES.match(response.get('Content-Type', ''))
+        ):
+            return response
+        encoding = choose_encoding(request)
+        if encoding is None:
+            return response
+
+        cache_key = getattr(response, 'compress_cache_key', None)
+        compressed = None
+        if cache_key:
+            cache = get_catalog_cache()
+            # The same payload may have been rendered as JSON or as the browsable API page
+            content_type = response['Content-Type'].split(';')[0].strip()
+            cache_key = f'{cache_key}:{response.status_code}:{content_type}:{encoding}'
+            compressed = cache.get(cache_key)
+        if compressed is None:
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            if cache_key:
+                cache.set(cache_key, compressed, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The compressed body differs byte for byte, so a strong ETag must be weakened
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,60 @@
+import hashlib
+import math
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .catalog import get_catalog_last_modified
+from .models import ServiceRequest
+
+
+def make_etag(*parts):
+    """Strong ETag from the parts identifying a payload, e.g. its versioned cache key"""
+    digest = hashlib.blake2b(':'.join(str(p) for p in parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def not_modified(request, etag, last_modified):
+    """
+    The 304 response for a request whose If-None-Match/If-Modified-Since
+    match ``etag``/``last_modified`` (unix time), otherwise None. Call it
+    before building the body.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=_seconds(last_modified))
+    if response is not None and response.status_code == 304:
+        return set_validators(response, etag, last_modified)
+    return None
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(_seconds(last_modified))
+    # The validators are per language, so shared caches must key on it too
+    patch_vary_headers(response, ['Accept-Language'])
+    return response
+
+
+def _seconds(timestamp):
+    # HTTP dates have whole seconds, so the ETag is the precise validator;
+    # when both headers are sent If-None-Match wins. Rounded up, so a change
+    # later in the same second is never dated before the previous response.
+    return math.ceil(timestamp)
+
+
+def history_validators(user, *parts):
+    """
+    ``(etag, last_modified)`` for a page of ``user``'s service request
+    history identified by ``parts``. They come from the database (the
+    newest ``updated_at`` and the row count, one index range on
+    ``(user, updated_at)``), so every process agrees on them. Service
+    titles and the user's name are rendered there too, so catalog changes
+    and renames count as modifications.
+    """
+    stats = ServiceRequest.objects.filter(user_id=user.pk).aggregate(
+        modified=Max('updated_at'), count=Count('id'))
+    last_modified = get_catalog_last_modified()
+    if stats['modified'] is not None:
+        last_modified = max(last_modified, stats['modified'].timestamp())
+    etag = make_etag(user.pk, user.full_name, stats['count'], stats['modified'], last_modified, *parts)
+    return etag, last_modified
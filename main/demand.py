@@ -0,0 +1,135 @@
+"""
+Daily demand rollups (ServiceDailyDemand).
+
+``record_demand`` adds new orders to the rollup inside the creating
+transaction, and ``remove_demand`` takes removed services and deleted
+orders back out, so reports never GROUP BY over ServiceRequest.
+``rebuild_demand`` recomputes a date range from the raw orders.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ServiceDailyDemand, ServiceRequest
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _other_orders(entries):
+    """
+    ``(user_id, day, service_id)`` ordered by requests other than those in
+    ``entries``, for the users, days and services ``entries`` touch
+    """
+    Through = ServiceRequest.services.through
+    days = {timezone.localdate(obj.created_at) for obj, _ in entries}
+    start, end = _day_bounds(min(days))[0], _day_bounds(max(days))[1]
+    others = set()
+    for user_id, created_at, service_id in Through.objects.filter(
+        servicerequest__user_id__in={obj.user_id for obj, _ in entries},
+        servicerequest__created_at__gte=start, servicerequest__created_at__lt=end,
+        service_id__in=set().union(*(ids for _, ids in entries)),
+    ).exclude(servicerequest_id__in=[obj.pk for obj, _ in entries]).values_list(
+        'servicerequest__user_id', 'servicerequest__created_at', 'service_id',
+    ):
+        others.add((user_id, timezone.localdate(created_at), service_id))
+    return others
+
+
+def _deltas(entries, sign):
+    """(day, service_id) -> [orders, distinct users], each ``sign`` (+1 or -1) per order / user"""
+    seen = _other_orders(entries)
+    deltas = defaultdict(lambda: [0, 0])
+    for obj, service_ids in entries:
+        day = timezone.localdate(obj.created_at)
+        for service_id in service_ids:
+            deltas[day, service_id][0] += sign
+            if (obj.user_id, day, service_id) not in seen:
+                seen.add((obj.user_id, day, service_id))
+                deltas[day, service_id][1] += sign
+    return deltas
+
+
+def _apply(deltas):
+    # One UPDATE per day, however many services the orders name. Counts stop
+    # at zero: a row reset or not yet rebuilt can't go negative on removals.
+    for day in sorted({day for day, _ in deltas}):
+        row_deltas = {service_id: delta for (d, service_id), delta in deltas.items() if d == day}
+        ServiceDailyDemand.objects.filter(date=day, service_id__in=row_deltas).update(
+            orders=Greatest(F('orders') + _by_service(row_deltas, 0), Value(0)),
+            distinct_users=Greatest(F('distinct_users') + _by_service(row_deltas, 1), Value(0)),
+        )
+
+
+def record_demand(entries):
+    """
+    Count ``entries``, an iterable of ``(service_request, service_ids)``
+    for newly created or newly added services, in the rollup. Whether a
+    user is new for a (day, service) is decided with one query over the
+    user's other orders that day.
+
+    Two concurrent first orders of the same user for the same service can
+    both count as distinct; ``rebuild_demand`` corrects that.
+    """
+    entries = [(obj, set(service_ids)) for obj, service_ids in entries if service_ids]
+    if not entries:
+        return
+    deltas = _deltas(entries, 1)
+    ServiceDailyDemand.objects.bulk_create(
+        [ServiceDailyDemand(date=day, service_id=service_id) for day, service_id in deltas],
+        ignore_conflicts=True)
+    _apply(deltas)
+
+
+def remove_demand(entries):
+    """
+    Take ``entries``, ``(service_request, service_ids)`` for services
+    removed from a request (or a request being deleted), out of the
+    rollup. The user stops counting as distinct for a (day, service)
+    once none of their other orders that day names the service.
+    """
+    entries = [(obj, set(service_ids)) for obj, service_ids in entries if service_ids]
+    if entries:
+        _apply(_deltas(entries, -1))
+
+
+def _by_service(row_deltas, index):
+    return Case(
+        *(When(service_id=service_id, then=Value(delta[index])) for service_id, delta in row_deltas.items()),
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+def rebuild_demand(date_from, date_to):
+    """
+    Recompute the rollup for ``date_from``..``date_to`` (inclusive) from
+    ServiceRequest, one day per transaction. Returns the rows written.
+    """
+    written = 0
+    day = date_from
+    Through = ServiceRequest.services.through
+    while day <= date_to:
+        start, end = _day_bounds(day)
+        rows = (
+            Through.objects
+            .filter(servicerequest__created_at__gte=start, servicerequest__created_at__lt=end)
+            .values('service_id')
+            .annotate(orders=Count('servicerequest_id'), users=Count('servicerequest__user_id', distinct=True))
+            .order_by()
+        )
+        with transaction.atomic():
+            ServiceDailyDemand.objects.filter(date=day).delete()
+            objs = ServiceDailyDemand.objects.bulk_create([
+                ServiceDailyDemand(date=day, service_id=row['service_id'], orders=row['orders'],
+                                   distinct_users=row['users'])
+                for row in rows
+            ])
+        written += len(objs)
+        day += timedelta(days=1)
+    return written
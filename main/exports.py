@@ -0,0 +1,142 @@
+import csv
+from datetime import datetime, time
+
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Service, ServiceRequest
+from .renderers import dumps
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+# Spreadsheets evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+TEXT_COLUMNS = ('user_name', 'phone_number', 'address', 'service_day', 'services', 'services_ar', 'details')
+EXPORT_COLUMNS = (
+    'id', 'created_at', 'user_id', 'user_name', 'phone_number', 'address', 'service_day',
+    'service_ids', 'services', 'services_ar', 'details',
+)
+
+
+class InvalidExportFilter(ValueError):
+    pass
+
+
+def parse_bound(value, end=False):
+    """
+    ``YYYY-MM-DD`` or an ISO datetime as an aware datetime. A bare date
+    as an upper bound covers that whole day.
+    """
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value)
+    except ValueError:  # well formed but impossible, e.g. 2024-02-30T10:00
+        raise InvalidExportFilter(f'Invalid date: {value}')
+    if moment is None:
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise InvalidExportFilter(f'Invalid date: {value}')
+        moment = datetime.combine(day, time.max if end else time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_service_ids(value):
+    if not value:
+        return None
+    try:
+        return [int(pk) for pk in value.split(',') if pk.strip()]
+    except ValueError:
+        raise InvalidExportFilter(f'Invalid service ids: {value}')
+
+
+def export_queryset(date_from=None, date_to=None, service_ids=None):
+    qs = ServiceRequest.objects.all()
+    if date_from:
+        qs = qs.filter(created_at__gte=date_from)
+    if date_to:
+        qs = qs.filter(created_at__lte=date_to)
+    if service_ids:
+        # A subquery instead of a join, so a request matching several services is exported once
+        Through = ServiceRequest.services.through
+        qs = qs.filter(id__in=Through.objects.filter(service_id__in=service_ids).values('servicerequest_id'))
+    return qs
+
+
+def iter_service_requests(queryset, chunk_size=2000):
+    """
+    Yield the requests in ``queryset`` in id order, ``chunk_size`` rows at
+    a time, with users joined and service titles prefetched per chunk.
+
+    Chunks are read by keyset on ``id`` instead of ``iterator()``: MySQL
+    drivers buffer a whole result set client-side, so one query over ten
+    million rows would hold all of them in memory.
+    """
+    queryset = queryset.select_related('user').only(
+        'id', 'created_at', 'phone_number', 'address', 'service_day', 'details',
+        'user__id', 'user__full_name',
+    ).order_by('id')
+    services = Prefetch('services', queryset=Service.objects.only('id', 'title', 'title_ar').order_by('id'))
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        prefetch_related_objects(chunk, services)
+        yield from chunk
+        last_id = chunk[-1].id
+
+
+def export_row(obj):
+    services = list(obj.services.all())
+    return {
+        'id': obj.id,
+        'created_at': obj.created_at.isoformat(),
+        'user_id': obj.user_id,
+        'user_name': obj.user.full_name,
+        'phone_number': obj.phone_number,
+        'address': obj.address,
+        'service_day': obj.service_day,
+        'service_ids': [s.id for s in services],
+        'services': [s.title for s in services],
+        'services_ar': [s.title_ar for s in services],
+        'details': obj.details or '',
+    }
+
+
+def escape_cell(value):
+    """Quote a user supplied CSV cell that a spreadsheet would run as a formula"""
+    if value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def iter_export(queryset, export_format='csv', chunk_size=2000):
+    """Encoded lines (bytes) of the export, for StreamingHttpResponse or a file"""
+    rows = (export_row(obj) for obj in iter_service_requests(queryset, chunk_size))
+    if export_format == 'jsonl':
+        for row in rows:
+            yield dumps(row) + b'\n'
+        return
+
+    writer = csv.writer(_Echo())
+    # BOM so spreadsheet apps open the Arabic columns as UTF-8
+    yield '\ufeff'.encode() + writer.writerow(EXPORT_COLUMNS).encode()
+    for row in rows:
+        for column in ('service_ids', 'services', 'services_ar'):
+            row[column] = ' | '.join(str(v) for v in row[column])
+        for column in TEXT_COLUMNS:
+            row[column] = escape_cell(row[column])
+        yield writer.writerow([row[column] for column in EXPORT_COLUMNS]).encode()
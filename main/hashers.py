@@ -0,0 +1,71 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    BasePasswordHasher, check_password, make_password, mask_hash,
+)
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_noop as _
+
+
+class PhoneHMACPasswordHasher(BasePasswordHasher):
+    """
+    Keyed HMAC-SHA256 hasher for the phone-number credential used by the
+    mobile app. The phone number is not a secret a user picks, so a slow
+    KDF buys nothing against an attacker who can enumerate phone numbers;
+    the server-side key (PHONE_CREDENTIAL_KEY) is what protects a leaked
+    hash. Admin passwords keep using the default PBKDF2 hasher.
+    """
+
+    algorithm = 'phone_hmac_sha256'
+
+    def _key(self):
+        return (getattr(settings, 'PHONE_CREDENTIAL_KEY', None) or settings.SECRET_KEY).encode()
+
+    def encode(self, password, salt):
+        self._check_encode_args(password, salt)
+        digest = hmac.new(self._key(), f'{salt}${password}'.encode(), hashlib.sha256).hexdigest()
+        return f'{self.algorithm}${salt}${digest}'
+
+    def decode(self, encoded):
+        algorithm, salt, digest = encoded.split('$', 2)
+        assert algorithm == self.algorithm
+        return {'algorithm': algorithm, 'hash': digest, 'salt': salt}
+
+    def verify(self, password, encoded):
+        decoded = self.decode(encoded)
+        return constant_time_compare(encoded, self.encode(password, decoded['salt']))
+
+    def safe_summary(self, encoded):
+        decoded = self.decode(encoded)
+        return {
+            _('algorithm'): decoded['algorithm'],
+            _('salt'): mask_hash(decoded['salt'], show=2),
+            _('hash'): mask_hash(decoded['hash']),
+        }
+
+    def harden_runtime(self, password, encoded):
+        pass
+
+
+def _credential_hasher():
+    return getattr(settings, 'LOGIN_CREDENTIAL_HASHER', 'default')
+
+
+def make_phone_credential(phone_number):
+    """Encode ``phone_number`` with the configured login credential hasher."""
+    return make_password(phone_number, hasher=_credential_hasher())
+
+
+def check_phone_credential(user, phone_number):
+    """
+    Verify ``phone_number`` against ``user.password``. Users still stored
+    with another hasher are re-encoded with the configured one on their
+    next successful login.
+    """
+    def setter(raw):
+        user.password = make_phone_credential(raw)
+        user.save(update_fields=['password'])
+
+    return check_password(phone_number, user.password, setter, preferred=_credential_hasher())
@@ -0,0 +1,210 @@
+"""
+``Idempotency-Key`` support for write endpoints.
+
+The first request with a key claims an IdempotencyRecord (the unique
+``(user, key)`` constraint decides who wins) and completes it with its
+response in the same transaction as its write. Retries replay that
+response; a retry arriving while the first request is still running
+waits briefly for it, then gets a 409.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IdempotencyRecord
+from .renderers import dumps
+
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05  # first wait (seconds) before looking again at a key another request holds
+
+
+class IdempotencyError(Exception):
+    status_code = 409
+    headers = {}
+
+
+class InvalidIdempotencyKey(IdempotencyError):
+    status_code = 400
+
+
+class IdempotencyKeyReused(IdempotencyError):
+    status_code = 422
+
+
+class IdempotencyKeyInProgress(IdempotencyError):
+    status_code = 409
+    headers = {'Retry-After': '1'}
+
+
+def request_hash(payload):
+    raw = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_TTL', 86400))
+
+
+def _wait():
+    return getattr(settings, 'IDEMPOTENCY_WAIT', 5)
+
+
+def _try_claim(user_id, key, payload_hash):
+    """
+    One attempt at the key: ``(record, None)`` when this request now owns
+    it, ``(None, stored)`` with a finished response to replay, or
+    ``(None, None)`` while another request still holds it.
+    """
+    try:
+        with transaction.atomic():
+            return IdempotencyRecord.objects.create(user_id=user_id, key=key, request_hash=payload_hash), None
+    except IntegrityError:
+        pass
+    stored = IdempotencyRecord.objects.filter(user_id=user_id, key=key).first()
+    if stored is None:
+        return None, None
+    now = timezone.now()
+    abandoned = _abandoned()
+    if stored.created_at < now - _ttl() or (stored.status_code is None and stored.created_at < now - abandoned):
+        # Take the row over in place rather than deleting it and inserting again
+        taken = IdempotencyRecord.objects.filter(pk=stored.pk, created_at=stored.created_at).update(
+            request_hash=payload_hash, status_code=None, body='', created_at=now)
+        if not taken:
+            return None, None
+        stored.request_hash, stored.status_code, stored.body, stored.created_at = payload_hash, None, '', now
+        return stored, None
+    if stored.request_hash != payload_hash:
+        raise IdempotencyKeyReused('Idempotency-Key was already used for a different request')
+    if stored.status_code is not None:
+        return None, stored
+    return None, None
+
+
+def _abandoned():
+    # A claim this old belongs to a worker that died mid-request
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+
+def _still_held(user_id, key):
+    """One cheap read while waiting; the full attempt runs once the key is released or done"""
+    return IdempotencyRecord.objects.filter(
+        user_id=user_id, key=key, status_code__isnull=True, created_at__gte=timezone.now() - _abandoned(),
+    ).exists()
+
+
+def _delays():
+    # Back off so a duplicate waiting IDEMPOTENCY_WAIT seconds polls a handful of times
+    delay = POLL_INTERVAL
+    while True:
+        yield delay
+        delay = min(delay * 2, 0.5)
+
+
+def _in_progress():
+    return IdempotencyKeyInProgress('A request with this Idempotency-Key is still in progress')
+
+
+def claim(user_id, key, payload_hash):
+    """
+    Return ``(record, None)`` when this request owns the key and must run
+    the write, or ``(None, stored)`` with the record to replay. Waits up
+    to IDEMPOTENCY_WAIT seconds for a request still holding the key.
+    """
+    deadline = time.monotonic() + _wait()
+    delays = _delays()
+    while True:
+        record, stored = _try_claim(user_id, key, payload_hash)
+        if record is not None or stored is not None:
+            return record, stored
+        while True:
+            if time.monotonic() >= deadline:
+                raise _in_progress()
+            time.sleep(next(delays))
+            if not _still_held(user_id, key):
+                break
+
+
+async def aclaim(user_id, key, payload_hash):
+    """
+    ``claim`` for async views. It waits on the event loop: sleeping inside
+    sync_to_async would hold the one thread all sync DB work shares.
+    """
+    try_claim, still_held = sync_to_async(_try_claim), sync_to_async(_still_held)
+    deadline = time.monotonic() + _wait()
+    delays = _delays()
+    while True:
+        record, stored = await try_claim(user_id, key, payload_hash)
+        if record is not None or stored is not None:
+            return record, stored
+        while True:
+            if time.monotonic() >= deadline:
+                raise _in_progress()
+            await asyncio.sleep(next(delays))
+            if not await still_held(user_id, key):
+                break
+
+
+def complete(record, body, status):
+    """Store the response; call it inside the transaction of the write"""
+    record.status_code = status
+    record.body = dumps(body).decode()
+    record.save(update_fields=['status_code', 'body'])
+
+
+def _check_key(key):
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise InvalidIdempotencyKey(f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters')
+
+
+def run_idempotent(user, key, payload, write):
+    """
+    Call ``write(record)`` -> ``(body, status)`` at most once per
+    ``(user, key)`` and return ``(body, status, replayed)``. ``write``
+    must pass ``record`` (None without a key) to ``complete``. Responses
+    are kept for IDEMPOTENCY_TTL seconds; a write that raises releases
+    the key so it can be retried.
+    """
+    if key is None:
+        body, status = write(None)
+        return body, status, False
+    _check_key(key)
+    record, stored = claim(user.pk, key, request_hash(payload))
+    if stored is not None:
+        return json.loads(stored.body), stored.status_code, True
+    try:
+        body, status = write(record)
+    except BaseException:
+        record.delete()
+        raise
+    return body, status, False
+
+
+async def arun_idempotent(user, key, payload, write):
+    """``run_idempotent`` for async views; the sync ``write`` runs through sync_to_async"""
+    write = sync_to_async(write)
+    if key is None:
+        body, status = await write(None)
+        return body, status, False
+    _check_key(key)
+    record, stored = await aclaim(user.pk, key, request_hash(payload))
+    if stored is not None:
+        return json.loads(stored.body), stored.status_code, True
+    try:
+        body, status = await write(record)
+    except BaseException:
+        await sync_to_async(record.delete)()
+        raise
+    return body, status, False
+
+
+def prune_idempotency_records():
+    """Delete records past IDEMPOTENCY_TTL; returns the count"""
+    deleted, _ = IdempotencyRecord.objects.filter(created_at__lt=timezone.now() - _ttl()).delete()
+    return deleted
@@ -0,0 +1,90 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+FORMAT_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def get_variant_widths():
+    return tuple(sorted(getattr(settings, 'SERVICE_IMAGE_WIDTHS', (160, 320, 640))))
+
+
+def _format():
+    return getattr(settings, 'SERVICE_IMAGE_FORMAT', 'WEBP').upper()
+
+
+def variant_name(name, width):
+    """``services/foo.jpg`` -> ``services/foo__w320.webp``"""
+    root, _ = os.path.splitext(name)
+    return f'{root}__w{width}.{FORMAT_EXTENSIONS[_format()]}'
+
+
+def pick_width(hint):
+    """Smallest configured width that covers ``hint`` (the largest if none does)."""
+    widths = get_variant_widths()
+    for width in widths:
+        if width >= hint:
+            return width
+    return widths[-1]
+
+
+def _render(source, width):
+    image = ImageOps.exif_transpose(source)
+    fmt = _format()
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, fmt, quality=getattr(settings, 'SERVICE_IMAGE_QUALITY', 75), optimize=True)
+    return buffer.getvalue()
+
+
+def generate_variants(image_file, widths=None):
+    """
+    Write the missing renditions of ``image_file`` (an ImageFieldFile) next
+    to the original. Returns the names written. Unreadable images are
+    reported and skipped so a bad upload never breaks saving a Service.
+    """
+    if not image_file:
+        return []
+    storage = image_file.storage
+    missing = [w for w in (widths or get_variant_widths())
+               if not storage.exists(variant_name(image_file.name, w))]
+    if not missing:
+        return []
+    try:
+        with storage.open(image_file.name, 'rb') as fh:
+            source = Image.open(fh)
+            source.load()
+    except (OSError, UnidentifiedImageError) as e:
+        print(f"[Images] Could not read {image_file.name}: {e}")
+        return []
+
+    # Renditions keep their derived name even on a content-hashed storage
+    save = getattr(storage, 'save_derived', storage.save)
+    written = []
+    for width in missing:
+        name = variant_name(image_file.name, width)
+        save(name, ContentFile(_render(source, width)))
+        written.append(name)
+    return written
+
+
+def get_variant_urls(image_file):
+    """Map of width -> URL for ``image_file``, generating missing renditions lazily."""
+    if not image_file:
+        return {}
+    generate_variants(image_file)
+    storage = image_file.storage
+    return {
+        str(width): storage.url(variant_name(image_file.name, width))
+        for width in get_variant_widths()
+        if storage.exists(variant_name(image_file.name, width))
+    }
@@ -0,0 +1,193 @@
+"""
+Bulk, idempotent import of the service catalog from a bilingual manifest.
+
+Each manifest row (JSONL object or CSV record) carries the text fields of
+a Service plus ``image``: a path (relative to the manifest) or an http(s)
+URL. Rows are matched to existing services by their English title. Images
+are fetched and decoded in a thread pool, rows whose text and image bytes
+are unchanged are skipped, and the rest are written with one
+``bulk_create`` and one ``bulk_update`` inside a single transaction.
+"""
+import csv
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+
+import requests
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+from .catalog import invalidate_catalog
+from .images import generate_variants
+from .models import Service
+
+TEXT_FIELDS = ('title', 'title_ar', 'description', 'description_ar', 'price', 'price_ar', 'details', 'details_ar')
+REQUIRED_FIELDS = ('title', 'title_ar', 'description', 'description_ar', 'price', 'price_ar', 'image')
+NATURAL_KEY = 'title'
+
+
+class ManifestError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    created: list = field(default_factory=list)
+    updated: list = field(default_factory=list)
+    unchanged: list = field(default_factory=list)
+    failed: list = field(default_factory=list)  # (title, reason)
+
+
+def read_manifest(path):
+    """Rows of a ``.jsonl`` or ``.csv`` manifest, with text fields as stripped strings"""
+    with open(path, encoding='utf-8-sig', newline='') as fh:
+        if path.endswith('.csv'):
+            raw_rows = list(csv.DictReader(fh))
+        else:
+            raw_rows = []
+            for number, line in enumerate(fh, 1):
+                if not line.strip():
+                    continue
+                try:
+                    raw_rows.append(json.loads(line))
+                except ValueError as e:
+                    raise ManifestError(f'{path}:{number}: {e}')
+
+    rows = []
+    seen = set()
+    for number, raw in enumerate(raw_rows, 1):
+        missing = [name for name in REQUIRED_FIELDS if not str(raw.get(name) or '').strip()]
+        if missing:
+            raise ManifestError(f'{path}: row {number} is missing {", ".join(missing)}')
+        # price is free text ("10", "١٠ ألف"); numbers in JSON are kept as written
+        row = {name: str(raw.get(name) or '').strip() for name in TEXT_FIELDS}
+        row['image'] = str(raw['image']).strip()
+        if row[NATURAL_KEY] in seen:
+            raise ManifestError(f'{path}: duplicate {NATURAL_KEY} {row[NATURAL_KEY]!r}')
+        seen.add(row[NATURAL_KEY])
+        rows.append(row)
+    return rows
+
+
+def _fetch(source, base_dir, timeout):
+    if source.startswith(('http://', 'https://')):
+        response = requests.get(source, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+    path = source if os.path.isabs(source) else os.path.join(base_dir, source)
+    with open(path, 'rb') as fh:
+        return fh.read()
+
+
+def _file_digest(storage, name):
+    digest = hashlib.sha256()
+    with storage.open(name, 'rb') as fh:
+        for chunk in fh.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_image(source, base_dir, timeout):
+    """Fetch and verify one image; returns ``(content, sha256)``. Runs in a worker."""
+    content = _fetch(source, base_dir, timeout)
+    try:
+        with Image.open(BytesIO(content)) as image:
+            image.verify()
+    except (OSError, UnidentifiedImageError) as e:
+        raise ValueError(f'not an image: {e}')
+    return content, hashlib.sha256(content).hexdigest()
+
+
+def _store_image(source, content):
+    """Save an image under the ``image`` field's upload_to and render its variants. Runs in a worker."""
+    image_field = Service._meta.get_field('image')
+    filename = os.path.basename(source.split('?', 1)[0]) or 'image'
+    name = image_field.storage.save(image_field.generate_filename(None, filename), ContentFile(content))
+    generate_variants(Service(image=name).image)
+    return name
+
+
+def import_services(path, workers=8, timeout=10, keep_images=False):
+    """
+    Import the manifest at ``path``. With ``keep_images``, images of
+    services that already exist are not fetched again. Rows whose image
+    can't be fetched or decoded are reported in ``failed`` and skipped.
+    """
+    rows = read_manifest(path)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    storage = Service._meta.get_field('image').storage
+    existing = {}
+    # Older catalogs may hold duplicates of a title; the oldest one wins
+    for service in Service.objects.filter(**{f'{NATURAL_KEY}__in': [r[NATURAL_KEY] for r in rows]}).order_by('id'):
+        existing.setdefault(getattr(service, NATURAL_KEY), service)
+
+    result = ImportResult()
+    to_fetch = [r for r in rows if not (keep_images and r[NATURAL_KEY] in existing)]
+    fetched_keys = {r[NATURAL_KEY] for r in to_fetch}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        # Each distinct source is fetched once, and each distinct image stored once
+        loads = {source: pool.submit(_load_image, source, base_dir, timeout)
+                 for source in {row['image'] for row in to_fetch}}
+        current_digests = {
+            service.image.name: pool.submit(_file_digest, storage, service.image.name)
+            for service in existing.values()
+            if service.image and storage.exists(service.image.name)
+        }
+        images = {}
+        for source, future in loads.items():
+            try:
+                images[source] = future.result()
+            except (OSError, ValueError, requests.RequestException) as e:
+                images[source] = e
+        known = {}  # sha256 -> name already in storage
+        for name, future in current_digests.items():
+            try:
+                known[future.result()] = name
+            except OSError:
+                pass
+        stores = {}
+        for source, loaded in images.items():
+            if not isinstance(loaded, Exception) and loaded[1] not in known and loaded[1] not in stores:
+                stores[loaded[1]] = pool.submit(_store_image, source, loaded[0])
+        stored = {digest: future.result() for digest, future in stores.items()}
+
+    now = timezone.now()
+    to_create, to_update = [], []
+    for row in rows:
+        key = row[NATURAL_KEY]
+        service = existing.get(key)
+        values = {name: row[name] for name in TEXT_FIELDS}
+        if key in fetched_keys:
+            loaded = images[row['image']]
+            if isinstance(loaded, Exception):
+                result.failed.append((key, str(loaded)))
+                continue
+            values['image'] = known.get(loaded[1]) or stored[loaded[1]]
+        else:
+            values['image'] = service.image.name
+        if service is None:
+            to_create.append(Service(**values))
+            continue
+        current = {name: getattr(service, name) for name in TEXT_FIELDS}
+        current['image'] = service.image.name
+        if current == values:
+            result.unchanged.append(service)
+            continue
+        for name, value in values.items():
+            setattr(service, name, value)
+        service.updated_at = now  # bulk_update skips auto_now; delta sync relies on it
+        to_update.append(service)
+
+    if to_create or to_update:
+        with transaction.atomic():
+            Service.objects.bulk_create(to_create, batch_size=500)
+            Service.objects.bulk_update(to_update, TEXT_FIELDS + ('image', 'updated_at'), batch_size=500)
+        # bulk writes skip the Service signals, so retire the catalog once here
+        invalidate_catalog()
+    result.created, result.updated = to_create, to_update
+    return result
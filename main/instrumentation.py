@@ -0,0 +1,167 @@
+import contextvars
+import functools
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.sections = defaultdict(float)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every DB connection. It reports to the
+    metrics of the request in the current context, which asgiref carries
+    into the threads async views run their ORM calls in.
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - start
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the wall time of the block to the ``name`` entry of the current
+    request's Server-Timing header. Also works as a decorator.
+    """
+    metrics = _current_metrics.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.sections[name] += time.perf_counter() - start
+
+
+def get_query_budget(url_name):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    return budgets.get(url_name, getattr(settings, 'QUERY_BUDGET_DEFAULT', None))
+
+
+def _server_timing(metrics, total):
+    parts = [f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"']
+    parts += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in metrics.sections.items()]
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts ORM queries and DB time per request, reports them (and any
+    ``timed`` sections) in ``X-Query-Count`` / ``Server-Timing`` and logs
+    requests whose query count exceeds the budget declared for their URL
+    name in QUERY_BUDGETS. Works under both WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_recorder)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, total):
+        response.query_count = metrics.queries  # for QueryBudgetTestMixin, whatever the headers setting
+        if getattr(settings, 'SERVER_TIMING_HEADERS', False):
+            response['X-Query-Count'] = str(metrics.queries)
+            response['Server-Timing'] = _server_timing(metrics, total)
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match else None
+        budget = get_query_budget(url_name)
+        if budget is not None and metrics.queries > budget:
+            print(f"[QueryBudget] {request.method} {request.path} ({url_name}) ran "
+                  f"{metrics.queries} queries, budget is {budget}")
+        return response
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin: ``assertWithinQueryBudget(response)`` fails when the
+    endpoint ran more queries than its QUERY_BUDGETS entry.
+    """
+
+    def assertWithinQueryBudget(self, response, budget=None):
+        url_name = response.resolver_match.url_name
+        if budget is None:
+            budget = get_query_budget(url_name)
+        self.assertIsNotNone(budget, f'No query budget declared for {url_name!r}')
+        queries = response.query_count
+        self.assertLessEqual(
+            queries, budget, f'{url_name} ran {queries} queries, budget is {budget}')
+
+
+def within_query_budget(test_method):
+    """
+    Decorator for test methods: every response returned by ``self.client``
+    during the test must stay within its endpoint's query budget.
+    """
+    @functools.wraps(test_method)
+    def wrapper(self, *args, **kwargs):
+        responses = []
+        original = self.client.request
+
+        def request(**request_kwargs):
+            response = original(**request_kwargs)
+            responses.append(response)
+            return response
+
+        self.client.request = request
+        try:
+            result = test_method(self, *args, **kwargs)
+        finally:
+            self.client.request = original
+        for response in responses:
+            budget = get_query_budget(response.resolver_match.url_name)
+            if budget is not None:
+                QueryBudgetTestMixin.assertWithinQueryBudget(self, response, budget)
+        return result
+    return wrapper
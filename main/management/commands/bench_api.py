@@ -0,0 +1,86 @@
+import json
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from main.authentication import get_token_cache
+from main.benchmark import SCENARIOS, Dataset, Runner, environment, use_file_test_database
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every API route against a throwaway database and report '
+            'p50/p95/p99 latency, requests/s and query counts')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--concurrency', default='1,4',
+                            help='Comma separated thread counts to run each scenario at')
+        parser.add_argument('--services', type=int, default=50)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--orders-per-user', type=int, default=20)
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help='Comma separated subset of: ' + ', '.join(SCENARIOS))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write machine-readable results (JSON) to this file')
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in options['scenarios'].split(',') if s]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            self.stderr.write(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+            return
+        levels = [int(c) for c in options['concurrency'].split(',') if c]
+
+        media_root = tempfile.mkdtemp(prefix='sham-bench-media-')
+        use_file_test_database()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(
+                MEDIA_ROOT=media_root,
+                TELEGRAM_BOT_TOKEN='', TELEGRAM_CHAT_ID='',
+                SERVER_TIMING_HEADERS=True,
+                DEBUG=False,
+                ALLOWED_HOSTS=['testserver'],
+                # measure the endpoints, not the load shedding
+                THROTTLE_RATES={}, MAX_INFLIGHT_WRITES=0,
+            ):
+                for alias in caches:
+                    caches[alias].clear()
+                get_token_cache().clear()
+                dataset = Dataset(options['services'], options['users'], options['orders_per_user'], options['seed'])
+                dataset.build()
+                # logout consumes one user per request
+                if 'logout' in scenarios and options['requests'] * len(levels) > len(dataset.users):
+                    self.stderr.write('Not enough users for logout; use --users >= requests x concurrency levels')
+
+                runner = Runner(dataset)
+                results = []
+                self.stdout.write(f'{"scenario":<20}{"conc":>5}{"req":>6}{"err":>5}{"rps":>9}'
+                                  f'{"p50":>9}{"p95":>9}{"p99":>9}{"queries":>9}')
+                for scenario in scenarios:
+                    for concurrency in levels:
+                        row = runner.run(scenario, options['requests'], concurrency)
+                        results.append(row)
+                        self.stdout.write(
+                            f'{row["scenario"]:<20}{row["concurrency"]:>5}{row["requests"]:>6}{row["errors"]:>5}'
+                            f'{row["rps"] or 0:>9.1f}{row["p50_ms"] or 0:>9.2f}{row["p95_ms"] or 0:>9.2f}'
+                            f'{row["p99_ms"] or 0:>9.2f}{row["queries_mean"] or 0:>9.1f}')
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        if options['output']:
+            report = {
+                'environment': environment(),
+                'dataset': {
+                    'services': options['services'], 'users': options['users'],
+                    'orders_per_user': options['orders_per_user'], 'seed': options['seed'],
+                },
+                'results': results,
+            }
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
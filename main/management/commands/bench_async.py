@@ -0,0 +1,66 @@
+import json
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from main.authentication import get_token_cache
+from main.benchmark import AsyncRunner, Dataset, Runner, environment, use_file_test_database
+
+SCENARIOS = ('services_list_en', 'service_detail_en', 'history', 'create')
+
+
+class Command(BaseCommand):
+    help = ('Compare the sync DRF views (WSGI handler, one thread per client) with the '
+            'native async views (ASGI handler, one task per client) on a throwaway database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--concurrency', default='1,8,32')
+        parser.add_argument('--services', type=int, default=50)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--orders-per-user', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write machine-readable results (JSON) to this file')
+
+    def handle(self, *args, **options):
+        levels = [int(c) for c in options['concurrency'].split(',') if c]
+        media_root = tempfile.mkdtemp(prefix='sham-bench-media-')
+        use_file_test_database()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        results = []
+        try:
+            with override_settings(
+                MEDIA_ROOT=media_root, TELEGRAM_BOT_TOKEN='', TELEGRAM_CHAT_ID='',
+                SERVER_TIMING_HEADERS=True, DEBUG=False, ALLOWED_HOSTS=['testserver'],
+                # measure the endpoints, not the load shedding
+                THROTTLE_RATES={}, MAX_INFLIGHT_WRITES=0,
+            ):
+                for alias in caches:
+                    caches[alias].clear()
+                get_token_cache().clear()
+                dataset = Dataset(options['services'], options['users'], options['orders_per_user'], options['seed'])
+                dataset.build()
+                runners = {'wsgi': Runner(dataset), 'asgi': AsyncRunner(dataset)}
+
+                self.stdout.write(f'{"scenario":<20}{"mode":>6}{"conc":>6}{"err":>5}{"rps":>9}'
+                                  f'{"p50":>9}{"p95":>9}{"p99":>9}')
+                for scenario in SCENARIOS:
+                    for concurrency in levels:
+                        for mode, runner in runners.items():
+                            row = runner.run(scenario, options['requests'], concurrency)
+                            row['mode'] = mode
+                            results.append(row)
+                            self.stdout.write(
+                                f'{scenario:<20}{mode:>6}{concurrency:>6}{row["errors"]:>5}{row["rps"] or 0:>9.1f}'
+                                f'{row["p50_ms"] or 0:>9.2f}{row["p95_ms"] or 0:>9.2f}{row["p99_ms"] or 0:>9.2f}')
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump({'environment': environment(), 'results': results}, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from main.hashers import make_phone_credential
+from main.models import User
+from main.views import token_login
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measure token_login throughput for each credential hasher / token strategy (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--rounds', type=int, default=50,
+                            help='Logins per strategy')
+
+    def handle(self, *args, **options):
+        strategies = [
+            ('default', False),
+            ('phone_hmac_sha256', False),
+            ('phone_hmac_sha256', True),
+        ]
+        try:
+            with transaction.atomic():
+                users = [
+                    User(full_name=f'bench-login-{i}', phone_number=f'+9639{i:08d}')
+                    for i in range(options['users'])
+                ]
+                User.objects.bulk_create(users)
+                # MySQL doesn't return ids from bulk_create; bulk_update needs them
+                users = list(User.objects.filter(full_name__startswith='bench-login-').order_by('id'))
+                for hasher, reuse in strategies:
+                    rate = self.run_strategy(users, hasher, reuse, options['rounds'])
+                    self.stdout.write(
+                        f'{hasher:<20} reuse_token={str(reuse):<5} {rate:10.1f} logins/s')
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run_strategy(self, users, hasher, reuse, rounds):
+        factory = APIRequestFactory()
+        with override_settings(LOGIN_CREDENTIAL_HASHER=hasher, LOGIN_REUSE_TOKEN=reuse, THROTTLE_RATES={}):
+            for user in users:
+                user.password = make_phone_credential(user.phone_number)
+            User.objects.bulk_update(users, ['password'])
+
+            start = time.perf_counter()
+            for i in range(rounds):
+                user = users[i % len(users)]
+                request = factory.post('/api/login/', {
+                    'full_name': user.full_name, 'phone_number': user.phone_number}, format='json')
+                response = token_login(request)
+                assert response.status_code == 200, response.data
+            elapsed = time.perf_counter() - start
+        return rounds / elapsed
@@ -0,0 +1,44 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.exports import (
+    EXPORT_FORMATS, InvalidExportFilter, export_queryset, iter_export, parse_bound, parse_service_ids,
+)
+
+
+class Command(BaseCommand):
+    help = 'Stream service requests to CSV or JSONL with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--from', dest='date_from', help='Earliest created_at (YYYY-MM-DD or ISO datetime)')
+        parser.add_argument('--to', dest='date_to', help='Latest created_at; a bare date includes that day')
+        parser.add_argument('--services', help='Comma separated service ids')
+        parser.add_argument('--chunk-size', type=int, default=getattr(settings, 'EXPORT_CHUNK_SIZE', 2000),
+                            help='Rows fetched per query')
+        parser.add_argument('--output', '-o', default='-', help='File to write; "-" for stdout')
+
+    def handle(self, *args, **options):
+        try:
+            queryset = export_queryset(
+                parse_bound(options['date_from']),
+                parse_bound(options['date_to'], end=True),
+                parse_service_ids(options['services']),
+            )
+        except InvalidExportFilter as e:
+            raise CommandError(str(e))
+
+        out = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        rows = 0
+        try:
+            for line in iter_export(queryset, options['export_format'], options['chunk_size']):
+                out.write(line)
+                rows += 1
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        if options['export_format'] == 'csv':
+            rows -= 1  # header
+        self.stderr.write(self.style.SUCCESS(f'Exported {rows} service requests'))
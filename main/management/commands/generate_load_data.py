@@ -0,0 +1,210 @@
+import bisect
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from PIL import Image, ImageDraw
+
+from main.catalog import invalidate_catalog
+from main.models import Service, ServiceRequest, User
+
+TRADES = [
+    ('Carpentry', 'نجارة'), ('Blacksmithing', 'حدادة'), ('Painting', 'دهان'),
+    ('Electrical', 'كهرباء'), ('Plumbing', 'تمديدات صحية'), ('Plastering', 'تلييس'),
+    ('Aluminium', 'ألمنيوم'), ('Glass', 'زجاج'), ('Insulation', 'عزل'),
+    ('Air conditioning', 'تبريد وتكييف'), ('Kitchens', 'مطابخ'), ('Tiling', 'تبليط'),
+]
+FIRST_NAMES = ['Ahmad', 'Mohammad', 'Omar', 'Ali', 'Khaled', 'Sami', 'Rami', 'Hasan',
+               'Lina', 'Rana', 'Hiba', 'Maya', 'Nour', 'Sara', 'Yara', 'Dima']
+LAST_NAMES = ['Haddad', 'Khoury', 'Shami', 'Halabi', 'Hamwi', 'Najjar', 'Masri', 'Saleh']
+CITIES = [('Damascus', 'دمشق'), ('Aleppo', 'حلب'), ('Homs', 'حمص'), ('Latakia', 'اللاذقية'),
+          ('Hama', 'حماة'), ('Tartus', 'طرطوس')]
+DAYS = ['Saturday', 'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+# share of orders by number of services picked (1, 2, 3, 4, 5)
+FAN_OUT_WEIGHTS = [55, 25, 12, 5, 3]
+# share of orders by hour of day (quiet at night, peaks late morning / evening)
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 5, 8, 10, 11, 10, 9, 8, 8, 9, 10, 11, 10, 8, 6, 4, 2, 1]
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the timestamps we set instead of auto_now/auto_now_add."""
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+def zipf_cum_weights(n, s=0.9):
+    return list(itertools.accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def pick(rng, cum_weights):
+    return bisect.bisect_left(cum_weights, rng.random() * cum_weights[-1])
+
+
+def next_id(model):
+    return (model.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = ('Generate a reproducible synthetic dataset (users, bilingual services, '
+            'service requests) with batched bulk_create for load testing')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--services', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--days', type=int, default=365,
+                            help='Spread created_at over this many days before --end')
+        parser.add_argument('--end', help='Latest created_at date (YYYY-MM-DD, default today UTC)')
+        parser.add_argument('--prefix', default='load',
+                            help='Prefix for generated user names; change it to load a second dataset')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per INSERT')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Rows per transaction')
+        parser.add_argument('--placeholders', type=int, default=8, help='Distinct placeholder images')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.hour_weights = list(itertools.accumulate(HOUR_WEIGHTS))
+        self.options = options
+        end_date = (datetime.strptime(options['end'], '%Y-%m-%d').date()
+                    if options['end'] else datetime.now(dt_timezone.utc).date())
+        self.end = datetime.combine(end_date, dt_time.min, tzinfo=dt_timezone.utc)
+        self.start = self.end - timedelta(days=options['days'])
+
+        started = time.perf_counter()
+        services = self.create_services()
+        users = self.create_users()
+        self.create_requests(users, services)
+        invalidate_catalog()
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(users)} users, {len(services)} services and '
+            f'{options["requests"]} service requests in {time.perf_counter() - started:.1f}s'))
+
+    def random_timestamp(self, start=None):
+        """A moment between ``start`` and --end, denser towards recent days and daytime hours."""
+        start = start or self.start
+        span_days = max(1, (self.end - start).days)
+        day = int(span_days * self.rng.random() ** 0.7)  # skew towards the end of the window
+        hour = pick(self.rng, self.hour_weights)
+        moment = start + timedelta(days=day, hours=hour, seconds=self.rng.randrange(3600))
+        return min(moment, self.end)
+
+    def placeholder_images(self):
+        names = []
+        for i in range(self.options['placeholders']):
+            color = tuple(self.rng.randrange(60, 230) for _ in range(3))
+            image = Image.new('RGB', (640, 480), color)
+            ImageDraw.Draw(image).rectangle((40, 40, 600, 440), outline=(255, 255, 255), width=8)
+            buffer = BytesIO()
+            image.save(buffer, 'JPEG', quality=80)
+            names.append(default_storage.save(f'services/placeholder-{i}.jpg', ContentFile(buffer.getvalue())))
+        return names
+
+    def chunks(self, total):
+        size = self.options['chunk_size']
+        for offset in range(0, total, size):
+            yield offset, min(size, total - offset)
+
+    def create_services(self):
+        images = self.placeholder_images()
+        first_id = next_id(Service)
+        services = []
+        for i in range(self.options['services']):
+            title, title_ar = TRADES[i % len(TRADES)]
+            n = i // len(TRADES) + 1
+            created = self.random_timestamp()
+            services.append(Service(
+                id=first_id + i,
+                title=f'{title} {n}', title_ar=f'{title_ar} {n}',
+                description=f'Professional {title.lower()} services for homes and businesses.',
+                description_ar=f'خدمات {title_ar} احترافية للمنازل والمحلات.',
+                price=f'{self.rng.randrange(5, 200) * 1000} SYP',
+                price_ar=f'{self.rng.randrange(5, 200) * 1000} ل.س',
+                image=images[i % len(images)],
+                details=f'{title} visit, inspection and work on site.',
+                details_ar=f'زيارة وكشف وتنفيذ أعمال {title_ar} في الموقع.',
+                created_at=created, updated_at=created,
+            ))
+        fields = [Service._meta.get_field('created_at'), Service._meta.get_field('updated_at')]
+        with explicit_timestamps(*fields), transaction.atomic():
+            Service.objects.bulk_create(services, batch_size=self.options['batch_size'])
+        self.stdout.write(f'  services: {len(services)}')
+        return services
+
+    def create_users(self):
+        hasher = get_hasher(getattr(settings, 'LOGIN_CREDENTIAL_HASHER', 'default'))
+        first_id = next_id(User)
+        prefix = self.options['prefix']
+        users = []
+        field = User._meta.get_field('date_joined')
+        for offset, count in self.chunks(self.options['users']):
+            chunk = []
+            for i in range(offset, offset + count):
+                # Numbered by user id, so a second dataset (new --prefix) doesn't reuse phone numbers
+                phone = f'+9639{self.options["seed"] % 10}{first_id + i:07d}'
+                salt = ''.join(self.rng.choices('abcdefghijklmnopqrstuvwxyz0123456789', k=22))
+                chunk.append(User(
+                    id=first_id + i,
+                    full_name=f'{prefix}-{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)} {i}',
+                    phone_number=phone,
+                    password=hasher.encode(phone, salt),
+                    date_joined=self.random_timestamp(),
+                ))
+            with explicit_timestamps(field), transaction.atomic():
+                User.objects.bulk_create(chunk, batch_size=self.options['batch_size'])
+            users.extend(chunk)
+            self.stdout.write(f'  users: {offset + count}')
+        return users
+
+    def create_requests(self, users, services):
+        if not users or not services:
+            return
+        Through = ServiceRequest.services.through
+        user_weights = zipf_cum_weights(len(users), 0.8)  # a few heavy repeat customers
+        service_weights = zipf_cum_weights(len(services), 1.0)  # some trades are far more popular
+        fan_out = list(itertools.accumulate(FAN_OUT_WEIGHTS))
+        fields = [ServiceRequest._meta.get_field('created_at'), ServiceRequest._meta.get_field('updated_at')]
+        first_id = next_id(ServiceRequest)
+        batch_size = self.options['batch_size']
+
+        for offset, count in self.chunks(self.options['requests']):
+            requests, links = [], []
+            for i in range(offset, offset + count):
+                user = users[pick(self.rng, user_weights)]
+                city, city_ar = self.rng.choice(CITIES)
+                pk = first_id + i
+                obj = ServiceRequest(
+                    id=pk, user_id=user.id, phone_number=user.phone_number,
+                    address=f'{city_ar} - {city}, street {self.rng.randrange(1, 300)}',
+                    service_day=self.rng.choice(DAYS),
+                    details=self.rng.choice([None, '', 'Please call before coming', 'الرجاء الاتصال قبل الحضور']),
+                    created_at=self.random_timestamp(max(self.start, user.date_joined)),
+                )
+                obj.updated_at = obj.created_at
+                requests.append(obj)
+                wanted = min(pick(self.rng, fan_out) + 1, len(services))
+                chosen = set()
+                while len(chosen) < wanted:
+                    chosen.add(services[pick(self.rng, service_weights)].id)
+                links.extend(Through(servicerequest_id=pk, service_id=sid) for sid in sorted(chosen))
+            with explicit_timestamps(*fields), transaction.atomic():
+                ServiceRequest.objects.bulk_create(requests, batch_size=batch_size)
+                Through.objects.bulk_create(links, batch_size=batch_size)
+            self.stdout.write(f'  service requests: {offset + count}')
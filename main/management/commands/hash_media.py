@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from main.catalog import invalidate_catalog
+from main.images import generate_variants, get_variant_widths, variant_name
+from main.models import Service
+
+
+class Command(BaseCommand):
+    help = 'Move existing service images to content-hashed names, merging duplicates'
+
+    def handle(self, *args, **options):
+        changed = []
+        old_names = set()
+        storage = None
+        for service in Service.objects.only('id', 'image').iterator():
+            if not service.image:
+                continue
+            storage = service.image.storage
+            if not hasattr(storage, 'hashed_name'):
+                self.stderr.write('DEFAULT_FILE_STORAGE is not content-hashed')
+                return
+            with storage.open(service.image.name, 'rb') as fh:
+                name = storage.save(service.image.name, fh)
+            if name != service.image.name:
+                old_names.add(service.image.name)
+                service.image.name = name
+                service.updated_at = timezone.now()  # so delta-sync clients refetch it
+                changed.append(service)
+                generate_variants(service.image)
+
+        with transaction.atomic():
+            Service.objects.bulk_update(changed, ['image', 'updated_at'])
+            # Originals are removed only once no committed row points at them
+            transaction.on_commit(lambda: self.delete_originals(storage, old_names))
+        # bulk_update skips save() signals, so retire the catalog once here
+        if changed:
+            invalidate_catalog()
+        self.stdout.write(self.style.SUCCESS(f'Renamed {len(changed)} service images'))
+
+    def delete_originals(self, storage, names):
+        """Delete the pre-hash files and their renditions that no service still uses"""
+        in_use = set(Service.objects.filter(image__in=names).values_list('image', flat=True))
+        deleted = 0
+        for name in names - in_use:
+            for path in [name] + [variant_name(name, width) for width in get_variant_widths()]:
+                if storage.exists(path):
+                    storage.delete(path)
+                    deleted += 1
+        if deleted:
+            self.stdout.write(f'Deleted {deleted} superseded files')
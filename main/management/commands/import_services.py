@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.importer import ManifestError, import_services
+
+
+class Command(BaseCommand):
+    help = 'Create or update services from a bilingual JSONL/CSV manifest; unchanged rows are skipped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifest', help='Path to a .jsonl or .csv manifest')
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'IMPORT_WORKERS', 8),
+                            help='Threads fetching and decoding images in parallel')
+        parser.add_argument('--timeout', type=float, default=getattr(settings, 'IMPORT_TIMEOUT', 10),
+                            help='Seconds to wait for each image download')
+        parser.add_argument('--keep-images', action='store_true',
+                            help="Don't refetch images of services that already exist")
+
+    def handle(self, *args, **options):
+        try:
+            result = import_services(
+                options['manifest'], workers=options['workers'], timeout=options['timeout'],
+                keep_images=options['keep_images'])
+        except (ManifestError, OSError) as e:
+            raise CommandError(str(e))
+        for title, reason in result.failed:
+            self.stderr.write(self.style.WARNING(f'Skipped {title}: {reason}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(result.created)}, updated {len(result.updated)}, '
+            f'unchanged {len(result.unchanged)}, failed {len(result.failed)}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.idempotency import prune_idempotency_records
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses older than IDEMPOTENCY_TTL'
+
+    def handle(self, *args, **options):
+        deleted = prune_idempotency_records()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} idempotency records'))
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from main.demand import rebuild_demand
+from main.models import ServiceRequest
+
+
+class Command(BaseCommand):
+    help = 'Recompute ServiceDailyDemand from ServiceRequest (all days by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='First day (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last day (YYYY-MM-DD)')
+        parser.add_argument('--days', type=int, help='Only the last N days, e.g. from a nightly cron')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['days']:
+            date_from, date_to = today - timedelta(days=options['days'] - 1), today
+        else:
+            bounds = ServiceRequest.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+            if bounds['first'] is None:
+                self.stdout.write('No service requests')
+                return
+            date_from = self._date(options['date_from']) or timezone.localdate(bounds['first'])
+            date_to = self._date(options['date_to']) or timezone.localdate(bounds['last'])
+        if date_from > date_to:
+            raise CommandError('--from is after --to')
+        written = rebuild_demand(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} rollup rows for {date_from}..{date_to}'))
+
+    def _date(self, value):
+        if not value:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Invalid date: {value}')
+        return day
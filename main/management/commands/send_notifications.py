@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.notifications import dispatch_pending_notifications
+
+
+class Command(BaseCommand):
+    help = 'Drain the notification outbox and deliver pending Telegram messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'NOTIFICATION_WORKERS', 4),
+                            help='Number of threads sending messages in parallel')
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Maximum outbox rows claimed per batch')
+        parser.add_argument('--max-attempts', type=int, default=getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5),
+                            help='Give up on a message after this many failed attempts')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--digest', action='store_true',
+                            help='Batch a burst of pending messages into one Telegram message')
+        parser.add_argument('--async', dest='use_async', action='store_true',
+                            help='Send each batch concurrently with httpx (falls back to threads without httpx)')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain what is currently due and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = dispatch_pending_notifications(
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                digest=options['digest'],
+                max_attempts=options['max_attempts'],
+                use_async=options['use_async'],
+            )
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
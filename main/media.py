@@ -0,0 +1,90 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, quote_etag
+
+from .storage import is_hashed_name
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _cache_control(path):
+    if is_hashed_name(path):
+        return 'public, max-age=31536000, immutable'
+    return f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 86400)}"
+
+
+def _file_range(fh, start, length, chunk_size=64 * 1024):
+    fh.seek(start)
+    remaining = length
+    try:
+        while remaining > 0:
+            chunk = fh.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT with long-lived cache headers and single
+    byte-range support (206 / 416). Only with SERVE_MEDIA; otherwise the
+    web server is expected to map MEDIA_URL itself.
+    """
+    if not getattr(settings, 'SERVE_MEDIA', False):
+        raise Http404
+    try:
+        full_path = default_storage.path(path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    stat = os.stat(full_path)
+    etag = quote_etag(f'{int(stat.st_mtime)}-{stat.st_size}')
+    headers = {
+        'Cache-Control': _cache_control(path),
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+    }
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    size = stat.st_size
+    match = RANGE_RE.match(request.headers.get('Range', ''))
+    if match and (match.group(1) or match.group(2)):
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(0, size - int(last))
+            end = size - 1
+        if start >= size or start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _file_range(open(full_path, 'rb'), start, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+    for key, value in headers.items():
+        response[key] = value
+    return response
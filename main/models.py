@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 import secrets
 import uuid
@@ -24,6 +25,24 @@ class CustomUserManager(BaseUserManager):
         user.save()
         return user
 
+    def create_phone_user(self, full_name, phone_number, **extra_fields):
+        """Create an app user whose credential is their phone number."""
+        from .hashers import make_phone_credential
+
+        if not full_name:
+            raise ValueError('Full name is required')
+        if not phone_number:
+            raise ValueError('Phone number is required')
+
+        user = self.model(
+            full_name=full_name,
+            phone_number=phone_number,
+            **extra_fields
+        )
+        user.password = make_phone_credential(phone_number)
+        user.save()
+        return user
+
     def create_superuser(self, full_name, phone_number, password=None, **extra_fields):
         extra_fields.setdefault('is_staff', True)
         extra_fields.setdefault('is_superuser', True)
@@ -64,6 +83,25 @@ class Service(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # keyset pagination on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='service_created_id_idx'),
+            # delta sync on (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='service_updated_id_idx'),
+            # admin search by title prefix
+            models.Index(fields=['title'], name='service_title_idx'),
+            models.Index(fields=['title_ar'], name='service_title_ar_idx'),
+        ]
+
+
+
+class ServiceTombstone(models.Model):
+    """Records a deleted Service so delta-sync clients can drop it"""
+    service_id = models.PositiveIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Service #{self.service_id} deleted"
 
 
 
@@ -74,7 +112,11 @@ class ServiceRequest(models.Model):
     address = models.TextField()
     service_day = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     details = models.TextField(null=True, blank=True)
+    # Set on rows of a bulk insert whose backend doesn't return primary keys,
+    # so they can be found again (see orders.bulk_create_service_requests)
+    batch_token = models.UUIDField(null=True, blank=True, editable=False)
 
 
     def __str__(self):
@@ -82,3 +124,87 @@ class ServiceRequest(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # per-user history paged by (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='request_user_created_id_idx'),
+            # history validators: newest change and count per user
+            models.Index(fields=['user', 'updated_at'], name='request_user_updated_idx'),
+            # admin changelist: date hierarchy / ordering and phone search
+            models.Index(fields=['-created_at'], name='request_created_idx'),
+            models.Index(fields=['phone_number'], name='request_phone_idx'),
+        ]
+
+
+
+class IdempotencyRecord(models.Model):
+    """
+    The first response to a write sent with an ``Idempotency-Key`` header,
+    replayed to retries of it. ``status_code`` is null while that first
+    request is still running.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    body = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key} ({self.status_code or 'in progress'})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+        ]
+
+
+
+class ServiceDailyDemand(models.Model):
+    """
+    Orders per service per day (in TIME_ZONE), kept up to date as requests
+    are created; rebuild with ``manage.py rebuild_demand_rollups``.
+    """
+    date = models.DateField()
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='daily_demand')
+    orders = models.PositiveIntegerField(default=0)
+    distinct_users = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.service_id}: {self.orders}"
+
+    class Meta:
+        ordering = ['date', 'service']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'service'], name='demand_date_service_uniq'),
+        ]
+
+
+
+class NotificationOutbox(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    service_request = models.ForeignKey(
+        ServiceRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications')
+    text = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Notification #{self.pk} ({self.status})"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx'),
+        ]
@@ -1,42 +1,116 @@
 # sham_sy/notifications.py (adjust path to your app name)
 
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
+from .instrumentation import timed
+
+try:
+    import httpx
+except ImportError:  # optional; the worker falls back to the thread pool
+    httpx = None
+from .models import NotificationOutbox
+
+# Telegram rejects messages longer than this
+TELEGRAM_MAX_LENGTH = 4096
+
+_session_local = threading.local()
 
-def send_telegram_message(text: str):
+
+def get_http_session() -> requests.Session:
     """
-    Low-level helper to send a Telegram message.
-    Uses TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID from settings.py
+    Return a pooled ``requests.Session`` for the current thread so the
+    outbox worker re-uses TCP/TLS connections to Telegram.
     """
+    session = getattr(_session_local, "session", None)
+    if session is None:
+        pool_size = getattr(settings, "NOTIFICATION_WORKERS", 4)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session_local.session = session
+    return session
+
+
+def _telegram_request(text):
     token = getattr(settings, "TELEGRAM_BOT_TOKEN", None)
     chat_id = getattr(settings, "TELEGRAM_CHAT_ID", None)
-
-    # If not configured, just do nothing (don't break the API)
     if not token or not chat_id:
-        print("[Telegram] Missing TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID in settings.")
-        return
-
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    data = {
+        return None, None
+    api_url = getattr(settings, "TELEGRAM_API_URL", "https://api.telegram.org")
+    return f"{api_url}/bot{token}/sendMessage", {
         "chat_id": chat_id,
         "text": text,
         "parse_mode": "HTML",  # allow bold, etc.
     }
 
+
+def send_telegram_message(text: str, session=None) -> bool:
+    """
+    Low-level helper to send a Telegram message.
+    Uses TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID from settings.py
+    Returns True when Telegram accepted the message.
+    """
+    url, data = _telegram_request(text)
+
+    # If not configured, just do nothing (don't break the API)
+    if url is None:
+        print("[Telegram] Missing TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID in settings.")
+        return False
+
     try:
-        requests.post(url, data=data, timeout=5)
+        response = (session or requests).post(url, data=data, timeout=5)
     except requests.RequestException as e:
         # Don't break the main request if Telegram fails
         print(f"[Telegram] Failed to send message: {e}")
+        return False
+    if response.status_code != 200:
+        print(f"[Telegram] Failed to send message: HTTP {response.status_code}")
+        return False
+    return True
+
+
+async def asend_telegram_message(text: str, client) -> bool:
+    """
+    Async variant of ``send_telegram_message`` over an ``httpx.AsyncClient``.
+    """
+    url, data = _telegram_request(text)
+    if url is None:
+        print("[Telegram] Missing TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID in settings.")
+        return False
+    try:
+        response = await client.post(url, data=data, timeout=5)
+    except httpx.HTTPError as e:
+        print(f"[Telegram] Failed to send message: {e}")
+        return False
+    if response.status_code != 200:
+        print(f"[Telegram] Failed to send message: HTTP {response.status_code}")
+        return False
+    return True
+
+
+async def _asend_all(texts, concurrency):
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits) as client:
+        return await asyncio.gather(*(asend_telegram_message(text, client) for text in texts))
 
 
-def format_service_request_message(service_request) -> str:
+def format_service_request_message(service_request, services=None) -> str:
     """
     Build a nice, readable Telegram message for a ServiceRequest instance.
+    Pass ``services`` when they are already loaded to skip the M2M query.
     """
-    services = service_request.services.all()
+    if services is None:
+        services = service_request.services.all()
     # Prefer Arabic title if available
     service_titles = ", ".join(
         [s.title_ar or s.title for s in services]
@@ -59,10 +133,127 @@ def format_service_request_message(service_request) -> str:
     return text
 
 
+@timed("notify")
 def send_new_service_request_notification(service_request):
     """
-    Public function to be called from the view
-    whenever a ServiceRequest is created.
+    Send the notification for a ServiceRequest right away (blocking).
+    The API uses ``enqueue_service_request_notification`` instead.
     """
     text = format_service_request_message(service_request)
     send_telegram_message(text)
+
+
+@timed("notify")
+def enqueue_service_request_notification(service_request, services=None):
+    """
+    Public function to be called from the view
+    whenever a ServiceRequest is created.
+    Writes an outbox row; call it inside the transaction that creates
+    the ServiceRequest so both are committed together.
+    """
+    return NotificationOutbox.objects.create(
+        service_request=service_request,
+        text=format_service_request_message(service_request, services),
+    )
+
+
+@timed("notify")
+def enqueue_service_request_notifications(service_requests, services_per_request):
+    """
+    Queue notifications for many freshly created ServiceRequests with a
+    single INSERT.
+    """
+    return NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(
+            service_request=service_request,
+            text=format_service_request_message(service_request, services),
+        )
+        for service_request, services in zip(service_requests, services_per_request)
+    ])
+
+
+def _backoff(attempts):
+    base = getattr(settings, "NOTIFICATION_RETRY_BACKOFF", 5)
+    cap = getattr(settings, "NOTIFICATION_RETRY_BACKOFF_MAX", 600)
+    return timedelta(seconds=min(cap, base * 2 ** (attempts - 1)))
+
+
+def _claim_due(batch_size):
+    with transaction.atomic():
+        rows = list(
+            NotificationOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=NotificationOutbox.STATUS_PENDING, next_attempt_at__lte=timezone.now())
+            .order_by('id')[:batch_size]
+        )
+        if rows:
+            # Push the rows out of reach of other workers while we send them
+            NotificationOutbox.objects.filter(id__in=[r.id for r in rows]).update(
+                next_attempt_at=timezone.now() + timedelta(minutes=5))
+    return rows
+
+
+def _digest_batches(rows):
+    """
+    Group rows into messages that fit in one Telegram message.
+    """
+    batches, current, length = [], [], 0
+    separator = "\n\n— — —\n\n"
+    for row in rows:
+        extra = len(row.text) + (len(separator) if current else 0)
+        if current and length + extra > TELEGRAM_MAX_LENGTH:
+            batches.append(current)
+            current, length = [], 0
+            extra = len(row.text)
+        current.append(row)
+        length += extra
+    if current:
+        batches.append(current)
+    return [(batch, separator.join(r.text for r in batch)) for batch in batches]
+
+
+def _send(text):
+    return send_telegram_message(text, session=get_http_session())
+
+
+def dispatch_pending_notifications(batch_size=50, workers=4, digest=False, max_attempts=5, use_async=False):
+    """
+    Send one batch of due outbox rows over a thread pool, or concurrently
+    on an event loop with httpx when ``use_async`` is set and httpx is
+    installed. Returns ``(sent, failed)`` counts for the batch.
+    """
+    rows = _claim_due(batch_size)
+    if not rows:
+        return 0, 0
+
+    if digest and len(rows) > 1:
+        batches = _digest_batches(rows)
+    else:
+        batches = [([row], row.text) for row in rows]
+
+    texts = [text for _, text in batches]
+    if use_async and httpx is not None:
+        results = asyncio.run(_asend_all(texts, workers))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_send, texts))
+
+    now = timezone.now()
+    sent = failed = 0
+    for (batch, _), ok in zip(batches, results):
+        for row in batch:
+            row.attempts += 1
+            if ok:
+                row.status = NotificationOutbox.STATUS_SENT
+                row.sent_at = now
+                row.last_error = ""
+                sent += 1
+            else:
+                if row.attempts >= max_attempts:
+                    row.status = NotificationOutbox.STATUS_FAILED
+                row.next_attempt_at = now + _backoff(row.attempts)
+                row.last_error = "Telegram request failed"
+                failed += 1
+    NotificationOutbox.objects.bulk_update(
+        rows, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return sent, failed
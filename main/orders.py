@@ -0,0 +1,96 @@
+import uuid
+
+from django.db import connections, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+
+from .demand import record_demand
+from .models import Service, ServiceRequest
+from .idempotency import complete
+from .instrumentation import timed
+from .notifications import enqueue_service_request_notification, enqueue_service_request_notifications
+from .serializers import ServiceRequestSerializer
+
+
+def _fill_missing_pks(user, objs):
+    """
+    Backends such as MySQL don't return primary keys from bulk_create.
+    Recover them from the batch token stamped on every row of the insert:
+    ids of one INSERT ascend in row order, and other requests by the same
+    user in the meantime carry no (or another) token. Called inside the
+    creating transaction.
+    """
+    rows = list(
+        ServiceRequest.objects
+        .filter(user=user, batch_token=objs[0].batch_token,
+                created_at__gte=objs[0].created_at, created_at__lte=objs[-1].created_at)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+    if len(rows) != len(objs):
+        raise RuntimeError('Could not resolve primary keys of bulk created service requests')
+    for obj, pk in zip(objs, rows):
+        obj.pk = pk
+
+
+def create_service_request(user, payload, language='en', record=None):
+    """
+    Validate ``payload`` and create one ServiceRequest for ``user``,
+    queueing its notification. Returns ``(body, status)``. The claimed
+    IdempotencyRecord ``record``, if any, is completed in the same
+    transaction, so a stored response always matches a committed order.
+    """
+    ser = ServiceRequestSerializer(data=payload, context={'language': language})
+    if not ser.is_valid():
+        if record is not None:
+            complete(record, ser.errors, 400)
+        return ser.errors, 400
+    with transaction.atomic():
+        obj = ser.save(user=user)
+        # 🔔 Queue the Telegram notification; the send_notifications worker delivers it
+        enqueue_service_request_notification(obj, ser.validated_data['services'])
+        prefetch_related_objects([obj], 'services')
+        with timed('serialize'):
+            data = ServiceRequestSerializer(obj, context={'language': language}).data
+        body = {"status": True, "message": "Created", "data": data}
+        if record is not None:
+            complete(record, body, 201)
+    return body, 201
+
+
+def bulk_create_service_requests(user, validated_items, language='en'):
+    """
+    Create one ServiceRequest per validated serializer payload with a fixed
+    number of queries: one INSERT for the requests, one for the M2M rows and
+    one for the notification outbox, all in a single transaction.
+    """
+    Through = ServiceRequest.services.through
+    objs = []
+    services_per_obj = []
+    for item in validated_items:
+        item = dict(item)
+        # PrimaryKeyRelatedField keeps duplicates; the through table doesn't allow them
+        services_per_obj.append(list({s.pk: s for s in item.pop('services')}.values()))
+        objs.append(ServiceRequest(user=user, **item))
+    if not objs:
+        return []
+    returns_pks = connections[ServiceRequest.objects.db].features.can_return_rows_from_bulk_insert
+    if not returns_pks:
+        batch_token = uuid.uuid4()
+        for obj in objs:
+            obj.batch_token = batch_token
+
+    with transaction.atomic():
+        ServiceRequest.objects.bulk_create(objs)
+        if not returns_pks:
+            _fill_missing_pks(user, objs)
+        Through.objects.bulk_create([
+            Through(servicerequest_id=obj.pk, service_id=service.pk)
+            for obj, services in zip(objs, services_per_obj)
+            for service in services
+        ])
+        enqueue_service_request_notifications(objs, services_per_obj)
+        record_demand((obj, {s.pk for s in services}) for obj, services in zip(objs, services_per_obj))
+
+    title_field = 'title_ar' if language == 'ar' else 'title'
+    prefetch_related_objects(objs, Prefetch('services', queryset=Service.objects.only('id', title_field)))
+    return objs
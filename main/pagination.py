@@ -0,0 +1,131 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def get_page_size(request):
+    """Read ``?page_size=`` and clamp it to API_MAX_PAGE_SIZE."""
+    default = getattr(settings, 'API_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+    params = getattr(request, 'query_params', request.GET)
+    try:
+        size = int(params.get('page_size', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def encode_cursor(obj, reverse=False):
+    payload = {'c': obj.created_at.isoformat(), 'i': obj.pk, 'r': reverse}
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        created_at = parse_datetime(payload['c'])
+        pk = int(payload['i'])
+        reverse = bool(payload.get('r', False))
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if created_at is None:
+        raise InvalidCursor('Invalid cursor')
+    return created_at, pk, reverse
+
+
+def keyset_queryset(queryset, cursor=None, page_size=50):
+    """
+    Return ``(queryset, reverse)`` selecting one page (plus one look-ahead
+    row) of ``queryset`` ordered newest first by ``(created_at, id)``.
+
+    Pages are located with a range condition on ``(created_at, id)``
+    instead of OFFSET, so every page costs one index range scan.
+    """
+    reverse = False
+    if cursor:
+        created_at, pk, reverse = decode_cursor(cursor)
+        if reverse:
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+        else:
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+    if reverse:
+        queryset = queryset.order_by('created_at', 'pk')
+    else:
+        queryset = queryset.order_by('-created_at', '-pk')
+    return queryset[:page_size + 1], reverse
+
+
+def keyset_page(objects, page_size, reverse, cursor=None):
+    """Turn the rows fetched by ``keyset_queryset`` into ``(objects, next_cursor, previous_cursor)``."""
+    has_more = len(objects) > page_size
+    objects = objects[:page_size]
+    if reverse:
+        objects.reverse()
+
+    if not objects:
+        return objects, None, None
+
+    if reverse:
+        next_cursor = encode_cursor(objects[-1])
+        previous_cursor = encode_cursor(objects[0], reverse=True) if has_more else None
+    else:
+        next_cursor = encode_cursor(objects[-1]) if has_more else None
+        previous_cursor = encode_cursor(objects[0], reverse=True) if cursor else None
+    return objects, next_cursor, previous_cursor
+
+
+def paginate_keyset(queryset, cursor=None, page_size=50):
+    """
+    Return ``(objects, next_cursor, previous_cursor)`` for one page of
+    ``queryset`` ordered newest first by ``(created_at, id)``.
+    """
+    queryset, reverse = keyset_queryset(queryset, cursor, page_size)
+    return keyset_page(list(queryset), page_size, reverse, cursor)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for the admin that avoids ``COUNT(*)`` on big unfiltered
+    tables by reading the planner's row estimate. Filtered querysets and
+    tables below ADMIN_ESTIMATED_COUNT_THRESHOLD are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = _estimated_row_count(self.object_list.model)
+            if estimate is not None and estimate >= getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000):
+                return estimate
+        return super().count
+
+
+def _estimated_row_count(model):
+    table = model._meta.db_table
+    vendor = connection.vendor
+    with connection.cursor() as cursor:
+        if vendor == 'mysql':
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', [table])
+        elif vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
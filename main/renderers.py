@@ -0,0 +1,35 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional; fall back to DRF's pure-Python renderer
+    orjson = None
+
+_encoder = JSONEncoder()
+# Datetimes go through DRF's encoder too so the output format ("Z" for UTC,
+# microsecond handling) is unchanged.
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+
+def dumps(data):
+    """
+    Encode ``data`` as UTF-8 JSON bytes, with orjson when it is installed.
+    Types orjson doesn't know (Decimal, lazy strings, ...) go through
+    DRF's encoder.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=_encoder.default, option=_ORJSON_OPTIONS)
+    return JSONRenderer().render(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that uses orjson for the compact, non-indented case."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
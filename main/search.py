@@ -0,0 +1,154 @@
+"""
+In-process bilingual search over the service catalog.
+
+The inverted index maps normalized tokens to service ids and is kept up
+to date by the Service signals. Each process also compares the catalog
+version with the one it indexed, so edits made by another worker trigger
+a rebuild on that process's next search.
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from .catalog import get_catalog_version
+from .models import Service
+from .serializers import ServiceListSerializer
+
+FIELD_WEIGHTS = {
+    'title': 3.0, 'title_ar': 3.0,
+    'description': 1.0, 'description_ar': 1.0,
+    'details': 0.5, 'details_ar': 0.5,
+}
+# A hit in the fields of the requested language counts this much more
+SAME_LANGUAGE_BOOST = 1.5
+PREFIX_FACTOR = 0.5
+
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u0640\u064b-\u065f\u0670\u06d6-\u06ed]')
+ARABIC_FOLDING = str.maketrans({
+    '\u0623': '\u0627', '\u0625': '\u0627', '\u0622': '\u0627', '\u0671': '\u0627',  # أ إ آ ٱ -> ا
+    '\u0649': '\u064a', '\u0626': '\u064a',  # ى ئ -> ي
+    '\u0624': '\u0648',  # ؤ -> و
+    '\u0629': '\u0647',  # ة -> ه
+    '\u0621': '',  # bare hamza
+    **{chr(0x0660 + d): str(d) for d in range(10)},  # Arabic-Indic digits
+})
+TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Lower-case and fold Arabic spelling variants (alef/hamza/ta marbuta, diacritics)."""
+    return ARABIC_DIACRITICS.sub('', (text or '').lower()).translate(ARABIC_FOLDING)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def _field_language(field):
+    return 'ar' if field.endswith('_ar') else 'en'
+
+
+class ServiceSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.postings = {}      # token -> {service_id: {language: weight}}
+        self.vocabulary = []    # sorted tokens, for prefix lookups
+        self.documents = {}     # service_id -> {language: rendered list item}
+        self.service_tokens = {}
+
+    def _document(self, service):
+        return {
+            language: dict(ServiceListSerializer(service, context={'language': language}).data)
+            for language in ('en', 'ar')
+        }
+
+    def _add(self, service):
+        tokens = set()
+        for field, weight in FIELD_WEIGHTS.items():
+            language = _field_language(field)
+            for token in tokenize(getattr(service, field)):
+                entry = self.postings.setdefault(token, {}).setdefault(service.pk, defaultdict(float))
+                entry[language] += weight
+                tokens.add(token)
+        self.service_tokens[service.pk] = tokens
+        self.documents[service.pk] = self._document(service)
+
+    def _remove(self, service_id):
+        for token in self.service_tokens.pop(service_id, ()):
+            entries = self.postings.get(token)
+            if entries is not None:
+                entries.pop(service_id, None)
+                if not entries:
+                    del self.postings[token]
+        self.documents.pop(service_id, None)
+
+    def rebuild(self):
+        version = get_catalog_version()
+        with self._lock:
+            self.postings, self.documents, self.service_tokens = {}, {}, {}
+            for service in Service.objects.all():
+                self._add(service)
+            self.vocabulary = sorted(self.postings)
+            self.version = version
+
+    def update(self, service, version):
+        """Re-index ``service``, which changed the catalog to ``version``."""
+        with self._lock:
+            if self.version is None:
+                return  # not built yet; the first search builds it
+            self._remove(service.pk)
+            self._add(service)
+            self.vocabulary = sorted(self.postings)
+            self.version = version
+
+    def remove(self, service_id, version):
+        with self._lock:
+            if self.version is None:
+                return
+            self._remove(service_id)
+            self.vocabulary = sorted(self.postings)
+            self.version = version
+
+    def _matching_tokens(self, term):
+        """The exact token (if indexed) and every token starting with ``term``."""
+        start = bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            yield token, (1.0 if token == term else PREFIX_FACTOR)
+
+    def search(self, query, language='en', limit=20):
+        """
+        Services matching every term of ``query`` (the terms match as
+        prefixes), best first, rendered in ``language``.
+        """
+        if self.version != get_catalog_version():
+            self.rebuild()
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            scores = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                for token, factor in self._matching_tokens(term):
+                    for service_id, weights in self.postings[token].items():
+                        score = sum(
+                            weight * (SAME_LANGUAGE_BOOST if lang == language else 1.0)
+                            for lang, weight in weights.items()
+                        )
+                        term_scores[service_id] = max(term_scores[service_id], score * factor)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {sid: scores[sid] + s for sid, s in term_scores.items() if sid in scores}
+                if not scores:
+                    return []
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))[:limit]
+            return [self.documents[service_id][language] for service_id, _ in ranked]
+
+
+service_index = ServiceSearchIndex()
@@ -1,60 +1,107 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS, ManyRelatedField
 from .models import Service, User, ServiceRequest
+from .images import get_variant_urls, pick_width
 
-class ServiceDetailSerializer(serializers.ModelSerializer):
+
+class InvalidFieldset(ValueError):
+    pass
+
+
+class SparseFieldsetMixin:
+    """
+    Serves each name in ``localized_fields`` from its ``_ar`` column when
+    the context language is Arabic (the ``_ar`` twins never appear in the
+    output) and narrows the output to the ``fields``/``omit`` name sets in
+    the context. ``id`` is always kept.
+    """
+    localized_fields = ()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        arabic = self.context.get('language', 'en') == 'ar'
+        for name in self.localized_fields:
+            translated = fields.pop(f'{name}_ar', None)
+            if arabic and translated is not None and name in fields:
+                translated.source = f'{name}_ar'
+                fields[name] = translated
+        only = self.context.get('fields')
+        omit = self.context.get('omit')
+        if only:
+            fields = {name: field for name, field in fields.items() if name in only or name == 'id'}
+        if omit:
+            fields = {name: field for name, field in fields.items() if name not in omit or name == 'id'}
+        return fields
+
+    @classmethod
+    def available_fields(cls):
+        if '_available_fields' not in cls.__dict__:
+            cls._available_fields = frozenset(cls().fields)
+        return cls._available_fields
+
+    @classmethod
+    def clean_fieldset(cls, value):
+        """``"id,title"`` -> frozenset of names; raises InvalidFieldset for unknown names"""
+        if value is None:
+            return None
+        names = frozenset(name.strip() for name in value.split(',') if name.strip())
+        unknown = names - cls.available_fields()
+        if unknown:
+            raise InvalidFieldset(f"Unknown field(s): {', '.join(sorted(unknown))}")
+        return names or None
+
+    @classmethod
+    def get_columns(cls, context):
+        """Model columns read by the fields selected for ``context``"""
+        model_fields = {f.name for f in cls.Meta.model._meta.concrete_fields}
+        columns = {'id'}
+        for field in cls(context=context).fields.values():
+            if field.source in model_fields:
+                columns.add(field.source)
+        return columns
+
+
+class ImageVariantsMixin(serializers.Serializer):
+    """Adds ``image_variants`` (width -> URL) and honours an ``image_width`` hint in the context"""
+    image_variants = serializers.SerializerMethodField()
+
+    def get_image_variants(self, obj):
+        return get_variant_urls(obj.image)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        hint = self.context.get('image_width')
+        if hint and data.get('image'):
+            variants = data.get('image_variants') or get_variant_urls(instance.image)
+            data['image'] = variants.get(str(pick_width(hint)), data['image'])
+        return data
+
+    @classmethod
+    def get_columns(cls, context):
+        columns = super().get_columns(context)
+        if 'image_variants' in cls(context=context).fields:
+            columns.add('image')
+        return columns
+
+
+class ServiceDetailSerializer(ImageVariantsMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Service model including all fields"""
+    localized_fields = ('title', 'description', 'price', 'details')
+
     class Meta:
         model = Service
         fields = '__all__'
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        language = self.context.get('language', 'en')
-        
-        # Fields that have language versions
-        language_fields = ['title', 'description', 'price', 'details']
-        
-        if language == 'ar':
-            # For Arabic, use _ar fields and keep non-language fields
-            for field in language_fields:
-                if f'{field}_ar' in data:
-                    data[field] = data[f'{field}_ar']
-                    del data[f'{field}_ar']
-        else:
-            # For English, remove _ar fields
-            for field in language_fields:
-                if f'{field}_ar' in data:
-                    del data[f'{field}_ar']
-        
-        return data
 
-class ServiceListSerializer(serializers.ModelSerializer):
+class ServiceListSerializer(ImageVariantsMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Service model excluding details field"""
+    localized_fields = ('title', 'description', 'price')
+
     class Meta:
         model = Service
         exclude = ('details', 'details_ar')
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        language = self.context.get('language', 'en')
-        
-        # Fields that have language versions
-        language_fields = ['title', 'description', 'price']
-        
-        if language == 'ar':
-            # For Arabic, use _ar fields and keep non-language fields
-            for field in language_fields:
-                if f'{field}_ar' in data:
-                    data[field] = data[f'{field}_ar']
-                    del data[f'{field}_ar']
-        else:
-            # For English, remove _ar fields
-            for field in language_fields:
-                if f'{field}_ar' in data:
-                    del data[f'{field}_ar']
-        
-        return data
-
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """Serializer for user registration"""
     class Meta:
@@ -71,15 +118,55 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return super().validate(attrs)
 
     def create(self, validated_data):
-        user = User.objects.create_user(
+        user = User.objects.create_phone_user(
             full_name=validated_data['full_name'],
             phone_number=validated_data['phone_number'],
-            password=validated_data['phone_number']  
         )
         return user
 
-class ServiceRequestSerializer(serializers.ModelSerializer):
-    services = serializers.PrimaryKeyRelatedField(
+class BulkManyRelatedField(ManyRelatedField):
+    """
+    Resolves a list of primary keys with one ``IN`` query instead of one
+    ``get()`` per key. A ``service_lookup`` dict (pk -> object) in the
+    context is used instead of the database when given.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        pks = []
+        for item in data:
+            try:
+                if isinstance(item, bool):
+                    raise TypeError
+                pks.append(int(item))
+            except (TypeError, ValueError):
+                self.child_relation.fail('incorrect_type', data_type=type(item).__name__)
+
+        lookup = self.context.get('service_lookup')
+        if lookup is None:
+            lookup = self.child_relation.get_queryset().in_bulk(set(pks))
+        for item, pk in zip(data, pks):
+            if pk not in lookup:
+                self.child_relation.fail('does_not_exist', pk_value=item)
+        return [lookup[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
+class ServiceRequestSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    services = BulkPrimaryKeyRelatedField(
         queryset=Service.objects.all(), many=True)
     service_titles = serializers.SerializerMethodField()
     user_name = serializers.CharField(source='user.full_name', read_only=True)
@@ -89,8 +176,30 @@ class ServiceRequestSerializer(serializers.ModelSerializer):
         fields = ['id', 'service_titles', 'user_name', 'phone_number', 'address', 'service_day', 'created_at', 'services', 'details']
         read_only_fields = ['service_titles', 'user_name', 'created_at']
 
+    @classmethod
+    def setup_eager_loading(cls, queryset, language='en', fields=None, omit=None):
+        """
+        Load users and service titles up front so rendering costs a fixed
+        number of queries, reading only the columns the selected fields need.
+        """
+        context = {'language': language, 'fields': fields, 'omit': omit}
+        selected = cls(context=context).fields
+        # created_at is always loaded: keyset pagination cursors are built from it
+        columns = cls.get_columns(context) | {'created_at'}
+        if 'user_name' in selected:
+            queryset = queryset.select_related('user')
+            columns |= {'user__id', 'user__full_name'}
+        queryset = queryset.only(*columns)
+        if 'service_titles' in selected:
+            title_field = 'title_ar' if language == 'ar' else 'title'
+            queryset = queryset.prefetch_related(
+                Prefetch('services', queryset=Service.objects.only('id', title_field)))
+        elif 'services' in selected:
+            queryset = queryset.prefetch_related(Prefetch('services', queryset=Service.objects.only('id')))
+        return queryset
+
     def get_service_titles(self, obj):
         language = self.context.get('language', 'en')
         if language == 'ar':
             return [service.title_ar for service in obj.services.all()]
-        return [service.title for service in obj.services.all()]
\ No newline at end of file
+        return [service.title for service in obj.services.all()]
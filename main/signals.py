@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token
+from .catalog import invalidate_catalog
+from .demand import record_demand, remove_demand
+from .images import generate_variants
+from .search import service_index
+from .models import Service, ServiceRequest, ServiceTombstone, User
+
+
+@receiver(post_save, sender=Service)
+def service_saved(sender, instance, **kwargs):
+    generate_variants(instance.image)
+    # After commit: a reader between the bump and the commit would cache
+    # the old row under the new version
+    transaction.on_commit(lambda: service_index.update(instance, invalidate_catalog(instance.pk)))
+
+
+@receiver(post_delete, sender=Service)
+def service_deleted(sender, instance, **kwargs):
+    ServiceTombstone.objects.create(service_id=instance.pk)
+    pk = instance.pk  # cleared by delete() before the transaction commits
+    transaction.on_commit(lambda: service_index.remove(pk, invalidate_catalog(pk)))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # Covers token_login, register_user, token_logout and admin deletions
+    invalidate_token(instance.key)
+
+
+@receiver(m2m_changed, sender=ServiceRequest.services.through)
+def service_request_services_changed(sender, instance, action, reverse, pk_set=None, **kwargs):
+    # clear() is handled before it runs, while the links to subtract still exist
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # service.requests.add(...): instance is the Service
+        requests = ServiceRequest.objects.filter(pk__in=pk_set) if pk_set is not None else instance.requests.all()
+        entries = [(obj, {instance.pk}) for obj in requests]
+        # Retires the owners' history validators (derived from updated_at)
+        ServiceRequest.objects.filter(pk__in=[obj.pk for obj, _ in entries]).update(updated_at=timezone.now())
+    else:
+        if pk_set is None:
+            pk_set = set(instance.services.values_list('pk', flat=True))
+        entries = [(instance, pk_set)]
+        if action != 'post_add':
+            # Additions come with a row save (creation, admin edits) that already set updated_at
+            ServiceRequest.objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+    if action == 'post_add':
+        # Covers the create path (serializer save) and admin edits; bulk creates call record_demand
+        record_demand(entries)
+    else:
+        remove_demand(entries)
+
+
+@receiver(pre_delete, sender=ServiceRequest)
+def service_request_deleting(sender, instance, **kwargs):
+    # The cascade deletes the links without m2m_changed
+    remove_demand([(instance, set(instance.services.values_list('pk', flat=True)))])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        invalidate_token(key)
@@ -0,0 +1,49 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_LENGTH = 32
+HASHED_NAME_RE = re.compile(r'^[0-9a-f]{%d}(__w\d+)?\.\w+$' % HASH_LENGTH)
+
+
+def is_hashed_name(name):
+    """True for names produced by ContentHashedStorage (and renditions derived from them)."""
+    return bool(HASHED_NAME_RE.match(os.path.basename(name)))
+
+
+class ContentHashedStorage(FileSystemStorage):
+    """
+    Media storage that names every upload after the SHA-256 of its content
+    (``services/<hash>.jpg``). Identical uploads map to the same file, so a
+    re-upload costs no disk, and a name never changes content, so it can be
+    cached forever.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest.hexdigest()[:HASH_LENGTH] + ext)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def save_derived(self, name, content, max_length=None):
+        """
+        Save a file derived from a hashed original (e.g. an image rendition)
+        under ``name`` as given; it is content-addressed through its source.
+        """
+        return super().save(name, content, max_length=max_length)
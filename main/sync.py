@@ -0,0 +1,106 @@
+import base64
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Service, ServiceTombstone
+from .serializers import ServiceListSerializer
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+def encode_sync_token(updated_at, pk, deleted_at):
+    """
+    ``(updated_at, pk)`` is the last service the client has seen;
+    ``deleted_at`` is the point up to which it has seen deletions.
+    """
+    payload = {'t': updated_at.isoformat(), 'i': pk, 'd': deleted_at.isoformat()}
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_sync_token(token):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        updated_at = parse_datetime(payload['t'])
+        pk = int(payload['i'])
+        deleted_at = parse_datetime(payload['d'])
+    except (ValueError, KeyError, TypeError):
+        raise InvalidSyncToken('Invalid sync token')
+    if updated_at is None or deleted_at is None:
+        raise InvalidSyncToken('Invalid sync token')
+    # Tokens we issue carry an offset; a naive time can't be compared with now()
+    if timezone.is_naive(updated_at) or timezone.is_naive(deleted_at):
+        raise InvalidSyncToken('Invalid sync token')
+    return updated_at, pk, deleted_at
+
+
+def _retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def get_catalog_changes(since=None, language='en', image_width=None, fields=None, omit=None):
+    """
+    Return services created or updated after the ``since`` token, the IDs
+    of services deleted after it and the token to send next time.
+
+    Changes are read in ``(updated_at, id)`` order from the
+    ``service_updated_id_idx`` index, at most SYNC_PAGE_SIZE at a time;
+    ``has_more`` tells the client to call again with the new token. A
+    missing token, or one older than the tombstone retention window,
+    gives ``reset=True``: the client must replace its whole catalog.
+    """
+    now = timezone.now()
+    # Rewind by the overlap so rows saved by transactions still open right
+    # now are picked up next time; clients upsert, so repeats are harmless.
+    horizon = now - timedelta(seconds=getattr(settings, 'SYNC_OVERLAP_SECONDS', 2))
+    reset = since is None
+    if since is not None:
+        since_at, since_pk, deleted_since = decode_sync_token(since)
+        # Tombstones older than the retention window may have been pruned
+        reset = deleted_since < now - _retention()
+
+    page_size = getattr(settings, 'SYNC_PAGE_SIZE', 500)
+    context = {'language': language, 'image_width': image_width, 'fields': fields, 'omit': omit}
+    columns = ServiceListSerializer.get_columns(context) | {'updated_at'}
+    qs = Service.objects.only(*columns).order_by('updated_at', 'id')
+    deleted = []
+    if reset:
+        since_at, since_pk, deleted_since = None, 0, horizon
+    else:
+        qs = qs.filter(Q(updated_at__gt=since_at) | Q(updated_at=since_at, id__gt=since_pk))
+        deleted = list(ServiceTombstone.objects.filter(deleted_at__gt=deleted_since)
+                       .order_by('service_id').values_list('service_id', flat=True).distinct())
+        deleted_since = max(deleted_since, horizon)
+    services = list(qs[:page_size + 1])
+    has_more = len(services) > page_size
+    services = services[:page_size]
+
+    if has_more:
+        position = (services[-1].updated_at, services[-1].pk)
+    elif since_at is not None and since_at > horizon:
+        position = (since_at, since_pk)
+    else:
+        position = (horizon, 0)
+    token = encode_sync_token(*position, deleted_since)
+
+    data = ServiceListSerializer(services, many=True, context=context).data
+    return {
+        'data': data,
+        'deleted': deleted,
+        'since': token,
+        'has_more': has_more,
+        'reset': reset,
+    }
+
+
+def prune_tombstones():
+    """Delete tombstones older than the retention window; returns the count"""
+    deleted, _ = ServiceTombstone.objects.filter(deleted_at__lt=timezone.now() - _retention()).delete()
+    return deleted
@@ -1,3 +1,1207 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+from io import BytesIO, StringIO
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from datetime import datetime, timedelta
+from decimal import Decimal
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from django.db import connection
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .authentication import get_token_cache
+from .catalog import get_catalog_version
+from .conditional import set_validators
+from .hashers import check_phone_credential
+from .images import generate_variants, variant_name
+from .importer import ManifestError, import_services
+from .instrumentation import QueryBudgetTestMixin, within_query_budget
+from .storage import is_hashed_name
+from .search import service_index
+from .sync import encode_sync_token
+from .throttling import ConcurrencyLimitMiddleware
+from .renderers import FastJSONRenderer
+from .models import IdempotencyRecord, Service, ServiceDailyDemand, User, ServiceRequest, NotificationOutbox
+from .notifications import dispatch_pending_notifications
+
+
+# Throttle buckets live in the cache and would carry over between tests;
+# LoadSheddingTests enables the rates it exercises.
+_no_throttling = override_settings(THROTTLE_RATES={})
+# make_service() saves a real image and its renditions; keep them out of MEDIA_ROOT
+_media_root = tempfile.mkdtemp()
+_temp_media = override_settings(MEDIA_ROOT=_media_root)
+
+
+def setUpModule():
+    _no_throttling.enable()
+    _temp_media.enable()
+
+
+def tearDownModule():
+    _temp_media.disable()
+    _no_throttling.disable()
+    shutil.rmtree(_media_root, ignore_errors=True)
+
+
+def make_image(name='s.png', size=(800, 400)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'orange').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+def make_service(**kwargs):
+    fields = {
+        'title': 'Carpentry', 'title_ar': 'نجارة',
+        'description': 'Wood work', 'description_ar': 'أعمال خشب',
+        'price': '10', 'price_ar': '١٠',
+        'image': make_image(),
+    }
+    fields.update(kwargs)
+    return Service.objects.create(**fields)
+
+
+def make_user(full_name='Sami', phone_number='0999000000'):
+    return User.objects.create_user(full_name, phone_number, password=phone_number)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_list_is_served_from_cache(self):
+        make_service()
+        self.client.get('/api/services/')
+        with self.assertNumQueries(0):
+            res = self.client.get('/api/services/')
+        self.assertEqual(len(res.json()['data']), 1)
+
+    def test_list_is_paginated(self):
+        for i in range(3):
+            make_service(title=f'S{i}')
+        first = self.client.get('/api/services/?page_size=2').json()
+        self.assertEqual(len(first['data']), 2)
+        rest = self.client.get(f"/api/services/?page_size=2&cursor={first['pagination']['next']}").json()
+        self.assertEqual([s['title'] for s in first['data'] + rest['data']], ['S2', 'S1', 'S0'])
+
+    def test_languages_are_cached_separately(self):
+        make_service()
+        en = self.client.get('/api/services/').json()['data'][0]
+        ar = self.client.get('/api/services/', HTTP_ACCEPT_LANGUAGE='ar').json()['data'][0]
+        self.assertEqual(en['title'], 'Carpentry')
+        self.assertEqual(ar['title'], 'نجارة')
+
+    def test_save_and_delete_invalidate(self):
+        service = make_service()
+        self.client.get(f'/api/services/{service.id}/')
+        service.title = 'Joinery'
+        with self.captureOnCommitCallbacks(execute=True):
+            service.save()
+        res = self.client.get(f'/api/services/{service.id}/')
+        self.assertEqual(res.json()['data']['title'], 'Joinery')
+        with self.captureOnCommitCallbacks(execute=True):
+            service.delete()
+        self.assertEqual(self.client.get('/api/services/').status_code, 404)
+
+    def test_entries_expire_when_invalidation_is_missed(self):
+        service = make_service(image=None)
+        first = self.client.get('/api/services/')
+        # An edit handled by another worker never reaches this per-process cache
+        Service.objects.filter(pk=service.pk).update(title='Joinery')
+        self.assertEqual(self.client.get('/api/services/').json()['data'][0]['title'], 'Carpentry')
+        later = time.time() + settings.CATALOG_CACHE_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            res = self.client.get('/api/services/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['data'][0]['title'], 'Joinery')
+
+    def test_invalidation_waits_for_commit(self):
+        service = make_service()
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            service.title = 'Joinery'
+            service.save()
+            # A reader before the commit still caches under the old version
+            self.assertEqual(get_catalog_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_catalog_version(), version)
+
+
+class StubTelegramHandler(BaseHTTPRequestHandler):
+    messages = []
+    fail = False
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+        type(self).messages.append(parse_qs(body)['text'][0])
+        self.send_response(500 if type(self).fail else 200)
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class NotificationOutboxTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = HTTPServer(('127.0.0.1', 0), StubTelegramHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StubTelegramHandler.messages = []
+        StubTelegramHandler.fail = False
+        self.service = make_service()
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+        self.settings_override = override_settings(
+            TELEGRAM_BOT_TOKEN='t', TELEGRAM_CHAT_ID='1',
+            TELEGRAM_API_URL=f'http://127.0.0.1:{self.server.server_port}')
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+
+    def create_order(self):
+        return self.client.post('/api/service-request/create/', {
+            'services': [self.service.id], 'phone_number': '0999000000',
+            'address': 'Damascus', 'service_day': 'Monday'}, format='json')
+
+    def test_create_queues_without_sending(self):
+        self.assertEqual(self.create_order().status_code, 201)
+        self.assertEqual(StubTelegramHandler.messages, [])
+        self.assertEqual(NotificationOutbox.objects.filter(status='pending').count(), 1)
+
+    def test_worker_delivers_pending(self):
+        self.create_order()
+        self.create_order()
+        self.assertEqual(dispatch_pending_notifications(workers=2), (2, 0))
+        self.assertEqual(len(StubTelegramHandler.messages), 2)
+        self.assertEqual(NotificationOutbox.objects.filter(status='sent').count(), 2)
+
+    def test_digest_batches_burst(self):
+        for _ in range(3):
+            self.create_order()
+        self.assertEqual(dispatch_pending_notifications(digest=True), (3, 0))
+        self.assertEqual(len(StubTelegramHandler.messages), 1)
+
+    def test_async_worker_delivers_pending(self):
+        self.create_order()
+        self.create_order()
+        self.assertEqual(dispatch_pending_notifications(use_async=True), (2, 0))
+        self.assertEqual(len(StubTelegramHandler.messages), 2)
+
+    def test_failure_backs_off_then_gives_up(self):
+        StubTelegramHandler.fail = True
+        self.create_order()
+        self.assertEqual(dispatch_pending_notifications(max_attempts=1), (0, 1))
+        row = NotificationOutbox.objects.get()
+        self.assertEqual((row.status, row.attempts), ('failed', 1))
+
+
+class ServiceRequestHistoryTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.services = [make_service(title=f'S{i}') for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_orders(self, count):
+        for _ in range(count):
+            order = ServiceRequest.objects.create(
+                user=self.user, phone_number='0999000000', address='Damascus', service_day='Monday')
+            order.services.set(self.services)
+
+    def test_query_count_is_constant(self):
+        self.add_orders(1)
+        # history validators, the page, and its services
+        with self.assertNumQueries(3):
+            self.client.get('/api/service-requests/')
+        self.add_orders(10)
+        with self.assertNumQueries(3):
+            res = self.client.get('/api/service-requests/', HTTP_ACCEPT_LANGUAGE='ar')
+        data = res.json()['data']
+        self.assertEqual(len(data), 11)
+        self.assertEqual(data[0]['user_name'], 'Sami')
+        self.assertEqual(data[0]['service_titles'], ['نجارة'] * 3)
+        self.assertEqual(sorted(data[0]['services']), sorted(s.id for s in self.services))
+
+    def test_cursor_pagination_walks_forward_and_back(self):
+        self.add_orders(5)
+        first = self.client.get('/api/service-requests/?page_size=2').json()
+        self.assertEqual(len(first['data']), 2)
+        self.assertIsNone(first['pagination']['previous'])
+        second = self.client.get(f"/api/service-requests/?page_size=2&cursor={first['pagination']['next']}").json()
+        third = self.client.get(f"/api/service-requests/?page_size=2&cursor={second['pagination']['next']}").json()
+        self.assertEqual(len(third['data']), 1)
+        self.assertIsNone(third['pagination']['next'])
+        ids = [row['id'] for page in (first, second, third) for row in page['data']]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        back = self.client.get(f"/api/service-requests/?page_size=2&cursor={second['pagination']['previous']}").json()
+        self.assertEqual(back['data'], first['data'])
+        self.assertIsNone(back['pagination']['previous'])
+
+    def test_invalid_cursor(self):
+        res = self.client.get('/api/service-requests/?cursor=bogus')
+        self.assertEqual(res.status_code, 400)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        get_token_cache().clear()
+        self.client = APIClient()
+        res = self.client.post('/api/register/', {'full_name': 'Sami', 'phone_number': '0999000000'})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {res.json()['data']['token']}")
+
+    def test_second_request_skips_token_lookup(self):
+        self.client.get('/api/service-requests/')
+        with self.assertNumQueries(2):  # history validators and the (empty) page, no auth query
+            self.client.get('/api/service-requests/')
+
+    def test_logout_invalidates_cached_token(self):
+        self.client.get('/api/service-requests/')
+        self.assertEqual(self.client.post('/api/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/service-requests/').status_code, 401)
+
+    def test_login_rotates_token(self):
+        self.client.get('/api/service-requests/')
+        self.client.post('/api/login/', {'full_name': 'Sami', 'phone_number': '0999000000'})
+        self.assertEqual(self.client.get('/api/service-requests/').status_code, 401)
+
+
+class PhoneCredentialTests(TestCase):
+    def test_register_uses_fast_hasher(self):
+        self.client.post('/api/register/', {'full_name': 'Sami', 'phone_number': '0999000000'})
+        self.assertTrue(User.objects.get().password.startswith('phone_hmac_sha256$'))
+
+    def test_legacy_pbkdf2_user_is_migrated_on_login(self):
+        user = User.objects.create_user('Sami', '0999000000', password='0999000000')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        res = self.client.post('/api/login/', {'full_name': 'Sami', 'phone_number': '0999000000'})
+        self.assertEqual(res.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('phone_hmac_sha256$'))
+        self.assertTrue(check_phone_credential(user, '0999000000'))
+
+    @override_settings(LOGIN_REUSE_TOKEN=True)
+    def test_login_can_reuse_token(self):
+        self.client.post('/api/register/', {'full_name': 'Sami', 'phone_number': '0999000000'})
+        first = self.client.post('/api/login/', {'full_name': 'Sami', 'phone_number': '0999000000'})
+        second = self.client.post('/api/login/', {'full_name': 'Sami', 'phone_number': '0999000000'})
+        self.assertEqual(first.json()['data']['token'], second.json()['data']['token'])
+
+
+class MediaTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+
+class ImageVariantTests(MediaTestCase):
+    def test_variants_generated_on_upload(self):
+        service = make_service()
+        storage = service.image.storage
+        for width in (160, 320, 640):
+            name = service.image.name.rsplit('.', 1)[0] + f'__w{width}.webp'
+            self.assertTrue(storage.exists(name))
+            with storage.open(name) as fh:
+                self.assertEqual(Image.open(fh).size, (width, width // 2))
+
+    def test_variants_exposed_and_width_hint(self):
+        service = make_service()
+        data = self.client.get(f'/api/services/{service.id}/?image_width=300').json()['data']
+        self.assertEqual(set(data['image_variants']), {'160', '320', '640'})
+        self.assertEqual(data['image'], data['image_variants']['320'])
+
+    def test_missing_variants_generated_lazily(self):
+        service = make_service()
+        storage = service.image.storage
+        name = service.image.name.rsplit('.', 1)[0] + '__w160.webp'
+        storage.delete(name)
+        self.client.get('/api/services/')
+        self.assertTrue(storage.exists(name))
+
+
+class ContentHashedMediaTests(MediaTestCase):
+    def test_identical_uploads_share_one_file(self):
+        first = make_service(image=make_image('a.png'))
+        second = make_service(image=make_image('b_copy.png'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_hashed_name(first.image.name))
+
+    @override_settings(SERVE_MEDIA=True)
+    def test_hashed_media_is_immutable_and_supports_ranges(self):
+        service = make_service()
+        url = f'/media/{service.image.name}'
+        full = self.client.get(url)
+        self.assertEqual(full.status_code, 200)
+        self.assertIn('immutable', full['Cache-Control'])
+        body = b''.join(full.streaming_content)
+        partial = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial['Content-Range'], f'bytes 10-19/{len(body)}')
+        self.assertEqual(b''.join(partial.streaming_content), body[10:20])
+        self.assertEqual(self.client.get(url, HTTP_RANGE=f'bytes={len(body)}-').status_code, 416)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=full['ETag']).status_code, 304)
+
+    def test_hash_media_replaces_legacy_files(self):
+        service = make_service(image=None)
+        storage = service.image.storage
+        # Uploaded before content hashing: a plain name plus its renditions
+        legacy = FileSystemStorage.save(storage, 'services/legacy.png', make_image('legacy.png'))
+        Service.objects.filter(pk=service.pk).update(image=legacy)
+        service.refresh_from_db()
+        generate_variants(service.image)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('hash_media', stdout=StringIO())
+        service.refresh_from_db()
+        self.assertTrue(is_hashed_name(service.image.name))
+        self.assertTrue(storage.exists(service.image.name))
+        self.assertFalse(storage.exists(legacy))
+        self.assertFalse(storage.exists(variant_name(legacy, 320)))
+
+
+    @override_settings(SERVE_MEDIA=False)
+    def test_media_not_served_unless_enabled(self):
+        service = make_service()
+        self.assertEqual(self.client.get(f'/media/{service.image.name}').status_code, 404)
+
+
+class BatchServiceRequestTests(TestCase):
+    def setUp(self):
+        self.services = [make_service(title=f'S{i}') for i in range(3)]
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def order(self, *services):
+        return {'services': [s.id for s in services], 'phone_number': '0999000000',
+                'address': 'Damascus', 'service_day': 'Monday'}
+
+    def test_batch_creates_requests_links_and_notifications(self):
+        res = self.client.post('/api/service-request/batch/', [
+            self.order(*self.services), self.order(self.services[0])], format='json')
+        self.assertEqual(res.status_code, 201)
+        data = res.json()['data']
+        self.assertEqual([r['status'] for r in data], [True, True])
+        self.assertEqual(data[0]['data']['service_titles'], ['S2', 'S1', 'S0'])
+        self.assertEqual(ServiceRequest.objects.count(), 2)
+        self.assertEqual(ServiceRequest.services.through.objects.count(), 4)
+        self.assertEqual(NotificationOutbox.objects.count(), 2)
+
+    def test_batch_reports_invalid_items(self):
+        bad = self.order(self.services[0])
+        bad['services'] = [9999]
+        res = self.client.post('/api/service-request/batch/', {'requests': [self.order(self.services[1]), bad]}, format='json')
+        self.assertEqual(res.status_code, 207)
+        data = res.json()['data']
+        self.assertTrue(data[0]['status'])
+        self.assertIn('services', data[1]['errors'])
+        self.assertEqual(ServiceRequest.objects.count(), 1)
+
+    def test_batch_without_returned_pks(self):
+        # MySQL doesn't return ids from bulk_create
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert',
+                               new_callable=mock.PropertyMock, return_value=False):
+            res = self.client.post('/api/service-request/batch/', [
+                self.order(self.services[0]), self.order(self.services[1])], format='json')
+        self.assertEqual(res.status_code, 201)
+        titles = [r['data']['service_titles'] for r in res.json()['data']]
+        self.assertEqual(titles, [['S0'], ['S1']])
+
+    def test_batch_without_returned_pks_with_interleaved_order(self):
+        bulk_create = ServiceRequest.objects.bulk_create
+
+        def bulk_create_then_interleave(objs, *args, **kwargs):
+            created = bulk_create(objs, *args, **kwargs)
+            # A single order by the same user lands inside the batch's created_at range
+            other = ServiceRequest.objects.create(user=self.user, phone_number='0999000000', address='Homs',
+                                                  service_day='Friday')
+            ServiceRequest.objects.filter(pk=other.pk).update(created_at=objs[0].created_at)
+            for obj in created:
+                obj.pk = None
+            return created
+
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert',
+                               new_callable=mock.PropertyMock, return_value=False), \
+                mock.patch.object(ServiceRequest.objects, 'bulk_create', bulk_create_then_interleave):
+            res = self.client.post('/api/service-request/batch/', [
+                self.order(self.services[0]), self.order(self.services[1])], format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+        titles = [r['data']['service_titles'] for r in res.json()['data']]
+        self.assertEqual(titles, [['S0'], ['S1']])
+        self.assertEqual(ServiceRequest.objects.filter(address='Homs').get().services.count(), 0)
+
+
+class ServiceValidationQueryTests(TestCase):
+    def setUp(self):
+        self.services = [make_service(title=f'S{i}') for i in range(8)]
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+
+    def post(self, services):
+        return self.client.post('/api/service-request/create/', {
+            'services': services, 'phone_number': '0999000000',
+            'address': 'Damascus', 'service_day': 'Monday'}, format='json')
+
+    def test_write_path_is_independent_of_service_count(self):
+        with CaptureQueriesContext(connection) as one:
+            self.assertEqual(self.post([self.services[0].id]).status_code, 201)
+        with CaptureQueriesContext(connection) as eight:
+            self.assertEqual(self.post([s.id for s in self.services]).status_code, 201)
+        self.assertEqual(len(one), len(eight))
+
+    def test_error_messages_unchanged(self):
+        res = self.post([self.services[0].id, 9999])
+        self.assertEqual(res.json()['services'], ['Invalid pk "9999" - object does not exist.'])
+        res = self.post(['abc'])
+        self.assertEqual(res.json()['services'], ['Incorrect type. Expected pk value, received str.'])
+        res = self.post('1')
+        self.assertEqual(res.json()['services'], ['Expected a list of items but got type "str".'])
+
+
+# The manifest storage needs collectstatic, which tests don't run
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ServiceRequestAdminTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.services = [make_service(title=f'S{i}') for i in range(3)]
+        admin_user = User.objects.create_superuser('admin', '0911000000', password='pw')
+        self.client.force_login(admin_user)
+
+    def add_orders(self, count):
+        for _ in range(count):
+            order = ServiceRequest.objects.create(
+                user=self.user, phone_number='0999000000', address='Damascus', service_day='Monday')
+            order.services.set(self.services)
+
+    def test_changelist_query_count_is_bounded(self):
+        self.add_orders(2)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get('/admin/main/servicerequest/').status_code, 200)
+        self.add_orders(20)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get('/admin/main/servicerequest/')
+        self.assertEqual(len(few), len(many))
+
+    def test_search_by_name_phone_and_title(self):
+        self.add_orders(1)
+        for term in ('Sam', '0999', 'نجار', 'S1'):
+            res = self.client.get('/admin/main/servicerequest/', {'q': term})
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.context['cl'].result_count, 1, term)
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        get_token_cache().clear()
+        self.client = APIClient()
+        self.services = [make_service(title=f'S{i}') for i in range(5)]
+
+    @within_query_budget
+    def test_endpoints_stay_within_budget(self):
+        self.client.get('/api/services/')
+        self.client.get(f'/api/services/{self.services[0].id}/', HTTP_ACCEPT_LANGUAGE='ar')
+        token = self.client.post('/api/register/', {'full_name': 'Sami', 'phone_number': '0999000000'}).json()['data']['token']
+        token = self.client.post('/api/login/', {'full_name': 'Sami', 'phone_number': '0999000000'}).json()['data']['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        order = {'services': [s.id for s in self.services], 'phone_number': '0999000000',
+                 'address': 'Damascus', 'service_day': 'Monday'}
+        self.assertEqual(self.client.post('/api/service-request/create/', order, format='json').status_code, 201)
+        self.client.post('/api/service-request/batch/', [order, order], format='json')
+        self.client.get('/api/service-requests/')
+        self.client.post('/api/logout/')
+
+    @override_settings(SERVER_TIMING_HEADERS=True)
+    def test_headers_report_queries_and_timings(self):
+        res = self.client.get('/api/services/')
+        self.assertEqual(res['X-Query-Count'], '1')
+        self.assertIn('serialize;dur=', res['Server-Timing'])
+        self.assertWithinQueryBudget(res)
+        with self.assertRaises(AssertionError):
+            self.assertWithinQueryBudget(res, budget=0)
+
+    @override_settings(SERVER_TIMING_HEADERS=False)
+    def test_headers_off_by_default_but_budget_still_checked(self):
+        res = self.client.get('/api/services/')
+        self.assertFalse(res.has_header('X-Query-Count'))
+        self.assertFalse(res.has_header('Server-Timing'))
+        self.assertWithinQueryBudget(res)
+
+
+class ServiceSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.carpentry = make_service(title='Carpentry workshop', title_ar='ورشة نجارة',
+                                      description='Doors and wooden furniture', description_ar='أبواب وأثاث خشبي')
+        self.painting = make_service(title='Door painting', title_ar='دهان', description='Interior painting and doors',
+                                     description_ar='دهان داخلي', details_ar='إصلاح الأبواب')
+
+    def search(self, q, language='en'):
+        return self.client.get('/api/services/search/', {'q': q}, HTTP_ACCEPT_LANGUAGE=language)
+
+    def test_prefix_and_ranking(self):
+        data = self.search('carp').json()['data']
+        self.assertEqual([s['id'] for s in data], [self.carpentry.id])
+        # a title hit outranks a description hit
+        data = self.search('door').json()['data']
+        self.assertEqual([s['id'] for s in data], [self.painting.id, self.carpentry.id])
+
+    def test_arabic_normalization_and_language(self):
+        # no hamza, ta marbuta written as ha
+        data = self.search('ابواب نجاره', 'ar').json()['data']
+        self.assertEqual([s['title'] for s in data], ['ورشة نجارة'])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.search('carp')
+        self.painting.title = 'Carpet cleaning'
+        self.painting.description = 'Rugs'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.painting.save()
+        self.assertEqual(service_index.version, get_catalog_version())
+        self.assertEqual(len(self.search('carp').json()['data']), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.carpentry.delete()
+        self.assertEqual([s['title'] for s in self.search('carp').json()['data']], ['Carpet cleaning'])
+
+    def test_index_not_updated_before_commit(self):
+        self.search('carp')
+        self.painting.title = 'Carpet cleaning'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.painting.save()
+            self.assertEqual(len(self.search('carp').json()['data']), 1)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.search('zzz').status_code, 404)
+
+    def test_search_does_not_query_database_once_built(self):
+        self.search('carp')
+        with self.assertNumQueries(0):
+            self.search('paint')
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_token_cache().clear()
+        self.service = make_service()
+        self.user = make_user()
+        self.token = Token.objects.create(user=self.user).key
+
+    async def test_catalog_matches_sync_views(self):
+        client = AsyncClient()
+        for url in ('/api/services/', f'/api/services/{self.service.id}/'):
+            sync_body = (await sync_to_async(self.client.get)(url, HTTP_ACCEPT_LANGUAGE='ar')).json()
+            async_res = await client.get(url.replace('/api/', '/api/async/'), headers={'Accept-Language': 'ar'})
+            self.assertEqual(async_res.status_code, 200)
+            self.assertEqual(async_res.json(), sync_body)
+
+    async def test_create_and_history(self):
+        client = AsyncClient()
+        auth = {'Authorization': f'Token {self.token}'}
+        res = await client.post('/api/async/service-request/create/', {
+            'services': [self.service.id], 'phone_number': '0999000000',
+            'address': 'Damascus', 'service_day': 'Monday'}, content_type='application/json', headers=auth)
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(res.json()['data']['service_titles'], ['Carpentry'])
+        res = await client.get('/api/async/service-requests/', headers=auth)
+        self.assertEqual(len(res.json()['data']), 1)
+        self.assertEqual(await NotificationOutbox.objects.acount(), 1)
+
+    async def test_requires_token(self):
+        res = await AsyncClient().get('/api/async/service-requests/')
+        self.assertEqual(res.status_code, 401)
+        res = await AsyncClient().get('/api/async/service-requests/', headers={'Authorization': 'Token nope'})
+        self.assertEqual(res.json(), {'detail': 'Invalid token.'})
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(20):
+            make_service(title=f'Service {i}', image=None)
+
+    def test_gzip_negotiated_and_cached(self):
+        res = self.client.get('/api/services/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res['Vary'])
+        body = json.loads(gzip.decompress(res.content))
+        self.assertEqual(body, self.client.get('/api/services/').json())
+        with mock.patch('main.compression.compress') as compress:
+            again = self.client.get('/api/services/', HTTP_ACCEPT_ENCODING='gzip')
+        compress.assert_not_called()
+        self.assertEqual(again.content, res.content)
+
+    # The browsable API page links static files; the manifest exists only after collectstatic
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_cached_bodies_are_kept_per_content_type(self):
+        html = self.client.get('/api/services/', HTTP_ACCEPT='text/html', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(html['Content-Type'].startswith('text/html'))
+        res = self.client.get('/api/services/', HTTP_ACCEPT='application/json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(res['Content-Type'].startswith('application/json'))
+        self.assertEqual(json.loads(gzip.decompress(res.content))['status'], True)
+        again = self.client.get('/api/services/', HTTP_ACCEPT='text/html', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(again.content, html.content)
+
+    def test_identity_when_not_accepted(self):
+        res = self.client.get('/api/services/', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    def test_renderer_matches_drf(self):
+        data = {'title': 'نجارة', 'price': Decimal('1.50'), 'when': timezone.now(), 'ids': [1, 2]}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = make_service(details='Long text', details_ar='نص طويل')
+
+    def test_service_fields_narrow_output_and_select(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get('/api/services/?fields=title,image', HTTP_ACCEPT_LANGUAGE='ar')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(list(res.json()['data'][0]), ['id', 'title', 'image'])
+        self.assertEqual(res.json()['data'][0]['title'], 'نجارة')
+        sql = ctx.captured_queries[-1]['sql']
+        self.assertIn('"title_ar"', sql)
+        self.assertNotIn('"title",', sql)
+        self.assertNotIn('description', sql)
+
+    def test_detail_omit_and_full_output_unchanged(self):
+        full = self.client.get(f'/api/services/{self.service.id}/').json()['data']
+        self.assertNotIn('details_ar', full)
+        self.assertEqual(full['details'], 'Long text')
+        res = self.client.get(f'/api/services/{self.service.id}/?omit=details,image_variants')
+        expected = {k: v for k, v in full.items() if k not in ('details', 'image_variants')}
+        self.assertEqual(res.json()['data'], expected)
+
+    def test_unknown_field_rejected(self):
+        res = self.client.get('/api/services/?fields=title_ar')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('title_ar', res.json()['message'])
+
+    def test_history_fields_skip_joins(self):
+        user = make_user()
+        ServiceRequest.objects.create(user=user, phone_number='1', address='a', service_day='Monday').services.add(
+            self.service)
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.assertNumQueries(2):  # history validators and the page
+            res = client.get('/api/service-requests/?fields=address,created_at')
+        self.assertEqual(res.json()['data'], [{'id': mock.ANY, 'address': 'a', 'created_at': mock.ANY}])
+
+
+class ServiceSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.first = make_service(title='First', image=None)
+        self.second = make_service(title='Second', image=None)
+
+    def sync(self, since=None, **params):
+        if since:
+            params['since'] = since
+        res = self.client.get('/api/services/sync/', params)
+        self.assertEqual(res.status_code, 200, res.content)
+        return res.json()
+
+    @override_settings(SYNC_OVERLAP_SECONDS=0)
+    def test_delta_and_tombstones(self):
+        body = self.sync(fields='title')
+        self.assertTrue(body['sync']['reset'])
+        self.assertEqual([s['title'] for s in body['data']], ['First', 'Second'])
+
+        body = self.sync(body['sync']['since'])
+        self.assertEqual((body['data'], body['deleted'], body['sync']['reset']), ([], [], False))
+
+        since = body['sync']['since']
+        self.first.title = 'First v2'
+        self.first.save()
+        second_id = self.second.id
+        self.second.delete()
+        body = self.sync(since)
+        self.assertEqual([s['title'] for s in body['data']], ['First v2'])
+        self.assertEqual(body['deleted'], [second_id])
+
+    @override_settings(SYNC_PAGE_SIZE=1)
+    def test_pages_until_caught_up(self):
+        body = self.sync()
+        self.assertTrue(body['sync']['has_more'])
+        body = self.sync(body['sync']['since'])
+        self.assertEqual([s['id'] for s in body['data']], [self.second.id])
+        self.assertFalse(body['sync']['reset'])
+
+    def test_invalid_and_expired_tokens(self):
+        self.assertEqual(self.client.get('/api/services/sync/', {'since': 'junk'}).status_code, 400)
+        naive = datetime(2025, 1, 1)
+        self.assertEqual(self.client.get('/api/services/sync/',
+                                         {'since': encode_sync_token(naive, 0, naive)}).status_code, 400)
+        old = timezone.now() - timedelta(days=365)
+        body = self.sync(encode_sync_token(old, 0, old))
+        self.assertTrue(body['sync']['reset'])
+        self.assertEqual(len(body['data']), 2)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_token_cache().clear()
+        self.service = make_service()
+
+    def test_catalog_304_until_catalog_changes(self):
+        for url in ('/api/services/', f'/api/services/{self.service.id}/'):
+            res = self.client.get(url)
+            etag = res['ETag']
+            self.assertTrue(res.has_header('Last-Modified'))
+            with mock.patch('main.catalog.ServiceListSerializer') as list_ser, \
+                    mock.patch('main.catalog.ServiceDetailSerializer') as detail_ser:
+                res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(res.status_code, 304)
+            self.assertEqual(res['ETag'], etag)
+            list_ser.assert_not_called()
+            detail_ser.assert_not_called()
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=res['Last-Modified']).status_code, 304)
+        self.service.title = 'Joinery'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_validated_responses_vary_on_language(self):
+        res = self.client.get('/api/services/')
+        self.assertIn('Accept-Language', res['Vary'])
+        not_modified = self.client.get('/api/services/', HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertIn('Accept-Language', not_modified['Vary'])
+
+    async def test_async_catalog_varies_on_language(self):
+        res = await AsyncClient().get('/api/async/services/')
+        self.assertIn('Accept-Language', res['Vary'])
+
+    def test_history_304_with_one_query(self):
+        user = make_user()
+        token = Token.objects.create(user=user).key
+        client = APIClient(HTTP_AUTHORIZATION=f'Token {token}')
+        client.post('/api/service-request/create/', {
+            'services': [self.service.id], 'phone_number': '1', 'address': 'a', 'service_day': 'Monday'},
+            format='json')
+        etag = client.get('/api/service-requests/')['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get('/api/service-requests/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        client.post('/api/service-request/create/', {
+            'services': [self.service.id], 'phone_number': '1', 'address': 'b', 'service_day': 'Monday'},
+            format='json')
+        res = client.get('/api/service-requests/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.json()['data']), 2)
+
+    def test_history_validators_come_from_the_database(self):
+        user = make_user()
+        client = APIClient()
+        client.force_authenticate(user)
+        request = ServiceRequest.objects.create(user=user, phone_number='1', address='a', service_day='Monday')
+        request.services.add(self.service)
+        etag = client.get('/api/service-requests/')['ETag']
+        # As if the change happened in another process with its own cache
+        cache.clear()
+        ServiceRequest.objects.create(user=user, phone_number='1', address='b', service_day='Monday')
+        self.assertEqual(client.get('/api/service-requests/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = client.get('/api/service-requests/')['ETag']
+        request.services.remove(self.service)
+        self.assertEqual(client.get('/api/service-requests/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_last_modified_rounds_up(self):
+        response = set_validators(HttpResponse(), '"x"', 1700000000.2)
+        self.assertEqual(response['Last-Modified'], 'Tue, 14 Nov 2023 22:13:21 GMT')
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.carpentry = make_service(image=None)
+        self.plumbing = make_service(title='Plumbing', title_ar='سباكة', image=None)
+        self.user = make_user()
+        for i in range(5):
+            sr = ServiceRequest.objects.create(
+                user=self.user, phone_number='1', address=f'Street {i}', service_day='Monday')
+            sr.services.set([self.carpentry, self.plumbing] if i % 2 else [self.plumbing])
+        self.staff = User.objects.create_user('Admin', '0911', password='x', is_staff=True)
+
+    def test_staff_only(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/exports/service-requests.csv').status_code, 403)
+
+    def test_csv_and_jsonl_stream_in_chunks(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        with override_settings(EXPORT_CHUNK_SIZE=2), CaptureQueriesContext(connection) as ctx:
+            res = client.get('/api/exports/service-requests.csv')
+            self.assertTrue(res.streaming)
+            lines = b''.join(res.streaming_content).decode('utf-8-sig').splitlines()
+        # three chunks of requests plus their prefetches and the empty closing read
+        self.assertEqual(len(ctx.captured_queries), 7)
+        self.assertEqual(len(lines), 6)
+        self.assertIn('Carpentry | Plumbing', lines[2])
+
+        res = client.get(f'/api/exports/service-requests.jsonl?services={self.carpentry.id}')
+        rows = [json.loads(line) for line in b''.join(res.streaming_content).splitlines()]
+        self.assertEqual([r['address'] for r in rows], ['Street 1', 'Street 3'])
+        self.assertEqual(rows[0]['services_ar'], ['نجارة', 'سباكة'])
+
+    def test_invalid_filter(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        self.assertEqual(client.get('/api/exports/service-requests.csv?from=yesterday').status_code, 400)
+        self.assertEqual(client.get('/api/exports/service-requests.csv?from=2024-02-30T10:00:00').status_code, 400)
+        with self.assertRaises(CommandError):
+            call_command('export_service_requests', date_from='2024-02-30T10:00:00', stdout=StringIO())
+
+    def test_csv_cells_cannot_start_formulas(self):
+        ServiceRequest.objects.create(user=self.user, phone_number='+963911', address='=HYPERLINK("x")',
+                                      service_day='Monday', details='@SUM(A1)')
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        res = client.get('/api/exports/service-requests.csv')
+        rows = list(csv.DictReader(b''.join(res.streaming_content).decode('utf-8-sig').splitlines()))
+        self.assertEqual(rows[-1]['address'], "'=HYPERLINK(\"x\")")
+        self.assertEqual(rows[-1]['details'], "'@SUM(A1)")
+        self.assertEqual(rows[-1]['phone_number'], "'+963911")
+        self.assertEqual(rows[0]['address'], 'Street 0')
+        res = client.get('/api/exports/service-requests.jsonl')
+        self.assertEqual(json.loads(b''.join(res.streaming_content).splitlines()[-1])['details'], '@SUM(A1)')
+
+
+class ServiceImportTests(MediaTestCase):
+    def write_manifest(self, rows, name='services.jsonl'):
+        for row in rows:
+            path = os.path.join(self.media_root, row['image'])
+            if not os.path.exists(path):
+                with open(path, 'wb') as fh:
+                    fh.write(make_image(size=(200, 100)).read())
+        path = os.path.join(self.media_root, name)
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write('\n'.join(json.dumps(row, ensure_ascii=False) for row in rows))
+        return path
+
+    def row(self, title, **kwargs):
+        row = {'title': title, 'title_ar': 'نجارة', 'description': 'd', 'description_ar': 'و',
+               'price': 10, 'price_ar': '١٠', 'image': 'carpentry.png'}
+        row.update(kwargs)
+        return row
+
+    def test_import_is_idempotent(self):
+        path = self.write_manifest([self.row('Carpentry'), self.row('Painting')])
+        result = import_services(path, workers=2)
+        self.assertEqual((len(result.created), len(result.updated)), (2, 0))
+        services = list(Service.objects.order_by('title'))
+        self.assertEqual(services[0].price, '10')
+        # both rows share one content-hashed file and its renditions
+        self.assertEqual(services[0].image.name, services[1].image.name)
+        self.assertTrue(is_hashed_name(services[0].image.name))
+
+        with self.assertNumQueries(1):
+            result = import_services(path)
+        self.assertEqual((len(result.created), len(result.updated), len(result.unchanged)), (0, 0, 2))
+
+        path = self.write_manifest([self.row('Carpentry', price_ar='٢٠'), self.row('Painting')])
+        result = import_services(path)
+        self.assertEqual([s.title for s in result.updated], ['Carpentry'])
+        self.assertEqual(Service.objects.get(title='Carpentry').price_ar, '٢٠')
+        self.assertEqual(Service.objects.count(), 2)
+
+    def test_bundled_catalog_imports_offline(self):
+        with mock.patch('main.importer.requests.get', side_effect=AssertionError('network access')):
+            call_command('add_initial_services', stdout=StringIO())
+            self.assertEqual(Service.objects.count(), 4)
+            with self.assertNumQueries(1):
+                result = import_services(os.path.join(settings.BASE_DIR, 'main', 'data', 'initial_services.jsonl'))
+        self.assertEqual(len(result.unchanged), 4)
+
+    def test_bad_rows(self):
+        path = self.write_manifest([self.row('Carpentry'), self.row('Broken', image='missing.png')])
+        os.remove(os.path.join(self.media_root, 'missing.png'))
+        result = import_services(path)
+        self.assertEqual([title for title, _ in result.failed], ['Broken'])
+        self.assertEqual(list(Service.objects.values_list('title', flat=True)), ['Carpentry'])
+        with open(path, 'a', encoding='utf-8') as fh:
+            fh.write('\n{"title": "No image"}')
+        with self.assertRaises(ManifestError):
+            import_services(path)
+
+
+class DemandRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_token_cache().clear()
+        self.carpentry = make_service(image=None)
+        self.plumbing = make_service(title='Plumbing', image=None)
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def order(self, *services, path='/api/service-request/create/'):
+        order = {'services': [s.id for s in services], 'phone_number': '1', 'address': 'a', 'service_day': 'Monday'}
+        return self.client.post(path, [order, order] if 'batch' in path else order, format='json')
+
+    def rollup(self):
+        return {(r.service_id, r.orders, r.distinct_users) for r in ServiceDailyDemand.objects.all()}
+
+    def test_incremental_matches_rebuild(self):
+        self.order(self.carpentry, self.plumbing)
+        self.order(self.carpentry)
+        self.order(self.carpentry, path='/api/service-request/batch/')
+        other = make_user('Rami', '0944')
+        self.client.force_authenticate(other)
+        self.order(self.plumbing)
+        expected = {(self.carpentry.id, 4, 1), (self.plumbing.id, 2, 2)}
+        self.assertEqual(self.rollup(), expected)
+
+        ServiceDailyDemand.objects.update(orders=0, distinct_users=0)
+        call_command('rebuild_demand_rollups', stdout=StringIO())
+        self.assertEqual(self.rollup(), expected)
+
+    def test_removals_and_deletes_are_subtracted(self):
+        first = ServiceRequest.objects.get(pk=self.order(self.carpentry, self.plumbing).json()['data']['id'])
+        second = ServiceRequest.objects.get(pk=self.order(self.carpentry).json()['data']['id'])
+        first.services.set([self.plumbing])  # admin edits go through set()
+        self.assertEqual(self.rollup(), {(self.carpentry.id, 1, 1), (self.plumbing.id, 1, 1)})
+        second.delete()
+        self.assertEqual(self.rollup(), {(self.carpentry.id, 0, 0), (self.plumbing.id, 1, 1)})
+        first.services.clear()
+        self.assertEqual(self.rollup(), {(self.carpentry.id, 0, 0), (self.plumbing.id, 0, 0)})
+        self.plumbing.requests.add(first)
+        self.assertEqual(self.rollup(), {(self.carpentry.id, 0, 0), (self.plumbing.id, 1, 1)})
+        self.plumbing.requests.clear()
+        self.assertEqual(self.rollup(), {(self.carpentry.id, 0, 0), (self.plumbing.id, 0, 0)})
+
+    def test_removal_never_goes_negative(self):
+        order = ServiceRequest.objects.get(pk=self.order(self.carpentry).json()['data']['id'])
+        ServiceDailyDemand.objects.update(orders=0, distinct_users=0)
+        order.delete()
+        self.assertEqual(self.rollup(), {(self.carpentry.id, 0, 0)})
+
+    def test_analytics_endpoint_reads_rollup(self):
+        self.order(self.carpentry)
+        staff = User.objects.create_user('Admin', '0911', password='x', is_staff=True)
+        self.client.force_authenticate(staff)
+        with self.assertNumQueries(1):
+            res = self.client.get(f'/api/analytics/demand/?services={self.carpentry.id}')
+        self.assertEqual(res.json()['data'], [{
+            'date': str(timezone.localdate()), 'service_id': self.carpentry.id, 'service': 'Carpentry',
+            'orders': 1, 'distinct_users': 1}])
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/analytics/demand/').status_code, 403)
+
+
+class LoadSheddingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(THROTTLE_RATES={'register': '2/min'})
+    def test_register_throttled_per_ip(self):
+        for i in range(2):
+            res = self.client.post('/api/register/', {'full_name': f'U{i}', 'phone_number': f'09{i}'})
+            self.assertEqual(res.status_code, 201)
+        res = self.client.post('/api/register/', {'full_name': 'U2', 'phone_number': '092'})
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(res['Retry-After'], '30')
+        res = self.client.post('/api/register/', {'full_name': 'U3', 'phone_number': '093'},
+                               REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(res.status_code, 201)
+
+    @override_settings(THROTTLE_RATES={'register': '2/min'})
+    def test_forwarded_for_cannot_pick_the_bucket(self):
+        for i in range(3):
+            res = self.client.post('/api/register/', {'full_name': f'U{i}', 'phone_number': f'09{i}'},
+                                   HTTP_X_FORWARDED_FOR=f'203.0.113.{i}')
+        self.assertEqual(res.status_code, 429)
+
+    @override_settings(THROTTLE_RATES={'register': '1/min'},
+                       REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1})
+    def test_forwarded_for_behind_proxy(self):
+        # The proxy appends the address it saw; anything before it is client supplied
+        self.assertEqual(self.client.post('/api/register/', {'full_name': 'U0', 'phone_number': '090'},
+                                          HTTP_X_FORWARDED_FOR='1.1.1.1, 198.51.100.7').status_code, 201)
+        self.assertEqual(self.client.post('/api/register/', {'full_name': 'U1', 'phone_number': '091'},
+                                          HTTP_X_FORWARDED_FOR='2.2.2.2, 198.51.100.7').status_code, 429)
+        self.assertEqual(self.client.post('/api/register/', {'full_name': 'U2', 'phone_number': '092'},
+                                          HTTP_X_FORWARDED_FOR='198.51.100.8').status_code, 201)
+
+    @override_settings(THROTTLE_RATES={'order': '1/min'})
+    def test_orders_throttled_per_user(self):
+        service = make_service(image=None)
+        order = {'services': [service.id], 'phone_number': '1', 'address': 'a', 'service_day': 'Monday'}
+        client = APIClient()
+        client.force_authenticate(make_user())
+        self.assertEqual(client.post('/api/service-request/create/', order, format='json').status_code, 201)
+        self.assertEqual(client.post('/api/service-request/create/', order, format='json').status_code, 429)
+        client.force_authenticate(make_user('Rami', '0944'))
+        self.assertEqual(client.post('/api/service-request/create/', order, format='json').status_code, 201)
+
+    @override_settings(MAX_INFLIGHT_WRITES=1)
+    def test_concurrent_writes_shed(self):
+        responses = []
+
+        def view(request):
+            # a second write arriving while this one is still running
+            responses.append(middleware(RequestFactory().post('/api/register/')))
+            return HttpResponse('ok')
+
+        middleware = ConcurrencyLimitMiddleware(view)
+        self.assertEqual(middleware(RequestFactory().post('/api/register/')).status_code, 200)
+        self.assertEqual(responses[0].status_code, 503)
+        self.assertEqual(responses[0]['Retry-After'], '1')
+        self.assertEqual(middleware.inflight, 0)
+        self.assertEqual(ConcurrencyLimitMiddleware(view)(RequestFactory().get('/')).status_code, 200)
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.service = make_service(image=None)
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.order = {'services': [self.service.id], 'phone_number': '0999000000',
+                      'address': 'Damascus', 'service_day': 'Monday'}
+
+    def create_order(self, key, **changes):
+        return self.client.post('/api/service-request/create/', {**self.order, **changes}, format='json',
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        first = self.create_order('k1')
+        self.assertEqual(first.status_code, 201)
+        retry = self.create_order('k1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(ServiceRequest.objects.count(), 1)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertEqual(self.create_order('k2').status_code, 201)
+        self.assertEqual(ServiceRequest.objects.count(), 2)
+
+    def test_key_reused_for_different_request(self):
+        self.create_order('k1')
+        res = self.create_order('k1', address='Aleppo')
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(ServiceRequest.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT=0)
+    def test_duplicate_of_unfinished_request(self):
+        from .idempotency import request_hash
+        IdempotencyRecord.objects.create(user=self.user, key='k1', request_hash=request_hash(self.order))
+        res = self.create_order('k1')
+        self.assertEqual(res.status_code, 409)
+        self.assertEqual(res['Retry-After'], '1')
+        self.assertFalse(ServiceRequest.objects.exists())
+
+    def test_expired_key_runs_again(self):
+        self.create_order('k1')
+        IdempotencyRecord.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.assertNotIn('Idempotent-Replayed', self.create_order('k1'))
+        self.assertEqual(ServiceRequest.objects.count(), 2)
+        IdempotencyRecord.objects.update(created_at=timezone.now() - timedelta(days=2))
+        call_command('prune_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+    @override_settings(IDEMPOTENCY_WAIT=0.2)
+    async def test_async_duplicate_waits_on_the_event_loop(self):
+        from .idempotency import request_hash
+        await IdempotencyRecord.objects.acreate(user=self.user, key='k1', request_hash=request_hash(self.order))
+        token = await sync_to_async(Token.objects.create)(user=self.user)
+        with mock.patch('main.idempotency.time.sleep') as sleep:
+            res = await AsyncClient().post('/api/async/service-request/create/', self.order,
+                                           content_type='application/json',
+                                           headers={'Authorization': f'Token {token.key}', 'Idempotency-Key': 'k1'})
+        self.assertEqual(res.status_code, 409)
+        self.assertEqual(res['Retry-After'], '1')
+        sleep.assert_not_called()
+
+    async def test_async_view_shares_keys(self):
+        first = await sync_to_async(self.create_order)('k1')
+        token = await sync_to_async(Token.objects.create)(user=self.user)
+        res = await AsyncClient().post('/api/async/service-request/create/', self.order,
+                                       content_type='application/json',
+                                       headers={'Authorization': f'Token {token.key}', 'Idempotency-Key': 'k1'})
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res['Idempotent-Replayed'], 'true')
+        self.assertEqual(res.json(), first.json())
+        self.assertEqual(await ServiceRequest.objects.acount(), 1)
+
+
+class LoadDataTests(TestCase):
+    def test_second_dataset_with_new_prefix(self):
+        for prefix in ('first', 'second'):
+            call_command('generate_load_data', users=5, services=3, requests=20, placeholders=1,
+                         prefix=prefix, stdout=StringIO())
+        self.assertEqual(User.objects.values('phone_number').distinct().count(), 10)
+        self.assertEqual(User.objects.filter(full_name__startswith='second-').count(), 5)
+        self.assertEqual(ServiceRequest.objects.count(), 40)
+
+
+class BenchLoginTests(TestCase):
+    def test_runs_without_returned_pks_and_rolls_back(self):
+        # MySQL doesn't return ids from bulk_create
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert',
+                               new_callable=mock.PropertyMock, return_value=False):
+            out = StringIO()
+            call_command('bench_login', users=2, rounds=2, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+        self.assertFalse(User.objects.filter(full_name__startswith='bench-login-').exists())
+
+
+class BenchApiTests(SimpleTestCase):
+    def test_smoke_report(self):
+        # bench_api builds its own throwaway database, so run it as a separate process
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'bench.json')
+            result = subprocess.run(
+                [sys.executable, 'manage.py', 'bench_api', '--requests', '2', '--concurrency', '1',
+                 '--services', '2', '--users', '2', '--orders-per-user', '1',
+                 '--scenarios', 'services_list_en,create,history', '--output', output],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=300)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            with open(output) as fh:
+                report = json.load(fh)
+        self.assertEqual(set(report), {'environment', 'dataset', 'results'})
+        self.assertEqual([row['scenario'] for row in report['results']], ['services_list_en', 'create', 'history'])
+        for row in report['results']:
+            self.assertEqual((row['concurrency'], row['requests'], row['errors']), (1, 2, 0))
+            self.assertIsNotNone(row['p95_ms'])
+            self.assertIsNotNone(row['queries_mean'])
@@ -0,0 +1,169 @@
+import math
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# Striped by bucket key: requests of one client are serialized, other
+# clients don't wait on a slow cache round trip
+_bucket_locks = [threading.Lock() for _ in range(64)]
+
+
+def parse_rate(rate):
+    """``"30/min"`` -> ``(capacity, tokens per second)``; None disables the throttle"""
+    if not rate:
+        return None
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / PERIODS[period[0]]
+
+
+def take_token(key, capacity, refill):
+    """
+    Take one token from the bucket stored under ``key``. Returns
+    ``(allowed, wait)``, ``wait`` being the seconds until a token is free.
+
+    The read-modify-write is atomic within a process; with a shared cache,
+    concurrent processes can let a request or two more through.
+    """
+    cache = caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+    with _bucket_locks[hash(key) % len(_bucket_locks)]:
+        now = time.time()
+        tokens, stamp = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - stamp) * refill)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # An idle bucket is full again after capacity / refill seconds
+        cache.set(key, (tokens, now), math.ceil(capacity / refill) + 1)
+    return allowed, 0 if allowed else (1 - tokens) / refill
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket throttle for the ``scope`` rate in THROTTLE_RATES:
+    ``"30/min"`` allows a burst of 30 requests, refilled evenly over a
+    minute. Unlike DRF's rate throttles it keeps no request history, just
+    ``(tokens, timestamp)`` per client.
+    """
+    scope = None
+    wait_seconds = 0
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        rate = parse_rate(getattr(settings, 'THROTTLE_RATES', {}).get(self.scope))
+        if rate is None:
+            return True
+        allowed, self.wait_seconds = take_token(
+            f'throttle:{self.scope}:{self.get_cache_key(request, view)}', *rate)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPThrottle(TokenBucketThrottle):
+    """Per client address; X-Forwarded-For is trusted only as far as NUM_PROXIES allows"""
+
+    def get_cache_key(self, request, view):
+        return f'ip:{self.get_ident(request)}'
+
+
+class UserThrottle(TokenBucketThrottle):
+    """Per user; anonymous requests share their IP's bucket"""
+
+    def get_cache_key(self, request, view):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+class RegisterThrottle(IPThrottle):
+    scope = 'register'
+
+
+class LoginThrottle(IPThrottle):
+    scope = 'login'
+
+
+class OrderThrottle(UserThrottle):
+    scope = 'order'
+
+
+def throttled_response(wait):
+    response = JsonResponse({"detail": f"Request was throttled. Expected available in {math.ceil(wait)} seconds."},
+                            status=429)
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Sheds load when more than MAX_INFLIGHT_WRITES requests with an unsafe
+    method are already running in this process: the extra ones get an
+    immediate 503 with Retry-After instead of queueing on the database.
+    Reads are never limited. Works under both WSGI and ASGI.
+
+    The count is per process. It only bites where a process runs writes
+    concurrently (ASGI, threaded workers); with single-threaded WSGI
+    workers the worker count is already the limit.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.lock = threading.Lock()
+        self.inflight = 0
+
+    def _enter(self):
+        limit = getattr(settings, 'MAX_INFLIGHT_WRITES', None)
+        with self.lock:
+            if limit and self.inflight >= limit:
+                return False
+            self.inflight += 1
+            return True
+
+    def _exit(self):
+        with self.lock:
+            self.inflight -= 1
+
+    def _busy(self):
+        response = JsonResponse({"status": False, "message": "Server is busy, please retry", "data": None},
+                                status=503)
+        response['Retry-After'] = str(getattr(settings, 'WRITE_RETRY_AFTER', 1))
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.method in SAFE_METHODS:
+            return self.get_response(request)
+        if not self._enter():
+            return self._busy()
+        try:
+            return self.get_response(request)
+        finally:
+            self._exit()
+
+    async def __acall__(self, request):
+        if request.method in SAFE_METHODS:
+            return await self.get_response(request)
+        if not self._enter():
+            return self._busy()
+        try:
+            return await self.get_response(request)
+        finally:
+            self._exit()
@@ -1,18 +1,33 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('services/', views.service_list, name='service-list'),
+    path('services/search/', views.service_search, name='service-search'),
+    path('services/sync/', views.service_sync, name='service-sync'),
     path('services/<int:service_id>/', views.service_detail, name='service-detail'),
     path('service-requests/', views.list_service_requests,
          name='list-service-requests'),
     path('service-request/create/', views.create_service_request,
          name='create-service-request'),
+    path('service-request/batch/', views.create_service_requests_batch,
+         name='create-service-requests-batch'),
+    path('exports/service-requests.<str:export_format>', views.export_service_requests,
+         name='export-service-requests'),
+    path('analytics/demand/', views.demand_analytics, name='demand-analytics'),
     
     
     path('register/', views.register_user, name='register-user'),
     path('login/', views.token_login, name='token-login'),
     path('logout/', views.token_logout, name='token-logout'),
+
+    # Native async versions, for ASGI deployments (sham.asgi)
+    path('async/services/', async_views.service_list, name='async-service-list'),
+    path('async/services/<int:service_id>/', async_views.service_detail, name='async-service-detail'),
+    path('async/service-requests/', async_views.list_service_requests,
+         name='async-list-service-requests'),
+    path('async/service-request/create/', async_views.create_service_request,
+         name='async-create-service-request'),
     
 
 ]
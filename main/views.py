@@ -1,16 +1,35 @@
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.authtoken.models import Token
-from django.core.exceptions import ObjectDoesNotExist
-from .models import Service, User, ServiceRequest
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_date
+from .models import Service, ServiceDailyDemand, User, ServiceRequest
 from .serializers import (
-    ServiceDetailSerializer, ServiceListSerializer,
-    UserRegistrationSerializer, ServiceRequestSerializer
+    InvalidFieldset, ServiceDetailSerializer, ServiceListSerializer, ServiceRequestSerializer,
+    UserRegistrationSerializer,
 )
+from .catalog import (
+    get_catalog_last_modified, get_service_detail_data, get_service_list_page, service_detail_key,
+    service_list_key,
+)
+from .conditional import history_validators, make_etag, not_modified, set_validators
+from .pagination import InvalidCursor, get_page_size, paginate_keyset
+from .hashers import check_phone_credential
+from .images import pick_width
 from django.db import IntegrityError
-from .notifications import send_new_service_request_notification
+from django.http import StreamingHttpResponse
+from .orders import bulk_create_service_requests, create_service_request as create_one_service_request
+from .idempotency import IdempotencyError, run_idempotent
+from .instrumentation import timed
+from .search import service_index
+from .throttling import LoginThrottle, OrderThrottle, RegisterThrottle
+from .sync import InvalidSyncToken, get_catalog_changes
+from .exports import (
+    EXPORT_FORMATS, InvalidExportFilter, export_queryset, iter_export, parse_bound, parse_service_ids,
+)
 
 
 def get_language(request):
@@ -18,42 +37,141 @@ def get_language(request):
     return 'ar' if raw.startswith('ar') else 'en'
 
 
+def get_image_width(request):
+    """``?image_width=`` snapped to a configured variant width, or None"""
+    params = getattr(request, 'query_params', request.GET)
+    try:
+        hint = int(params.get('image_width', ''))
+    except ValueError:
+        return None
+    return pick_width(hint) if hint > 0 else None
+
+
+def get_fieldset(request, serializer_class):
+    """
+    ``(fields, omit)`` from ``?fields=``/``?omit=`` (comma separated), as
+    name sets or None. Raises ``InvalidFieldset`` for unknown names.
+    """
+    params = getattr(request, 'query_params', request.GET)
+    return (serializer_class.clean_fieldset(params.get('fields')),
+            serializer_class.clean_fieldset(params.get('omit')))
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def service_list(request):
-    services = Service.objects.all()
-    if not services.exists():
+    cursor = request.query_params.get('cursor')
+    try:
+        fields, omit = get_fieldset(request, ServiceListSerializer)
+    except InvalidFieldset as e:
+        return Response({"status": False, "message": str(e), "data": []}, status=400)
+    params = (get_language(request), cursor, get_page_size(request), get_image_width(request), fields, omit)
+    last_modified = get_catalog_last_modified()
+    cached = not_modified(request, make_etag(service_list_key(*params)), last_modified)
+    if cached:
+        return cached
+    try:
+        page = get_service_list_page(*params)
+    except InvalidCursor:
+        return Response({"status": False, "message": "Invalid cursor", "data": []}, status=400)
+    data = page['data']
+    if not data and not cursor:
         return Response({"status": False, "message": "No services found", "data": []}, status=404)
-    ser = ServiceListSerializer(services, many=True, context={
-                                'language': get_language(request)})
-    return Response({"status": True, "message": f"Successfully retrieved {services.count()} services", "data": ser.data})
+    response = Response({"status": True, "message": f"Successfully retrieved {len(data)} services", "data": data,
+                         "pagination": {"next": page['next'], "previous": page['previous']}})
+    response.compress_cache_key = page['cache_key']
+    return set_validators(response, make_etag(page['cache_key']), last_modified)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def service_search(request):
+    query = (request.query_params.get('q') or '').strip()
+    if not query:
+        return Response({"status": False, "message": "q is required", "data": []}, status=400)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+    except ValueError:
+        limit = 20
+    data = service_index.search(query, get_language(request), limit)
+    if not data:
+        return Response({"status": False, "message": "No services found", "data": []}, status=404)
+    return Response({"status": True, "message": f"Found {len(data)} services", "data": data})
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def service_sync(request):
+    try:
+        fields, omit = get_fieldset(request, ServiceListSerializer)
+        changes = get_catalog_changes(
+            request.query_params.get('since'), get_language(request), get_image_width(request), fields, omit)
+    except InvalidSyncToken:
+        return Response({"status": False, "message": "Invalid sync token", "data": []}, status=400)
+    except InvalidFieldset as e:
+        return Response({"status": False, "message": str(e), "data": []}, status=400)
+    return Response({"status": True,
+                     "message": f"{len(changes['data'])} changed, {len(changes['deleted'])} deleted",
+                     "data": changes['data'], "deleted": changes['deleted'],
+                     "sync": {"since": changes['since'], "has_more": changes['has_more'],
+                              "reset": changes['reset']}})
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def service_detail(request, service_id):
     try:
-        service = Service.objects.get(id=service_id)
-    except ObjectDoesNotExist:
+        fields, omit = get_fieldset(request, ServiceDetailSerializer)
+    except InvalidFieldset as e:
+        return Response({"status": False, "message": str(e), "data": None}, status=400)
+    params = (service_id, get_language(request), get_image_width(request), fields, omit)
+    last_modified = get_catalog_last_modified()
+    cached = not_modified(request, make_etag(service_detail_key(*params)), last_modified)
+    if cached:
+        return cached
+    data, cache_key = get_service_detail_data(*params)
+    if data is None:
         return Response({"status": False, "message": f"Service with ID {service_id} not found", "data": None}, status=404)
-    ser = ServiceDetailSerializer(
-        service, context={'language': get_language(request)})
-    return Response({"status": True, "message": f"Successfully retrieved service with ID {service_id}", "data": ser.data})
+    response = Response({"status": True, "message": f"Successfully retrieved service with ID {service_id}", "data": data})
+    response.compress_cache_key = cache_key
+    return set_validators(response, make_etag(cache_key), last_modified)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])                
 def list_service_requests(request):
-    qs = ServiceRequest.objects.filter(user=request.user)
-    if not qs.exists():
+    language = get_language(request)
+    cursor = request.query_params.get('cursor')
+    try:
+        fields, omit = get_fieldset(request, ServiceRequestSerializer)
+    except InvalidFieldset as e:
+        return Response({"status": False, "message": str(e), "data": []}, status=400)
+    page_size = get_page_size(request)
+    etag, last_modified = history_validators(
+        request.user, language, cursor, page_size, sorted(fields or ()), sorted(omit or ()))
+    cached = not_modified(request, etag, last_modified)
+    if cached:
+        return cached
+    qs = ServiceRequestSerializer.setup_eager_loading(
+        ServiceRequest.objects.filter(user=request.user), language, fields, omit)
+    try:
+        requests_list, next_cursor, previous_cursor = paginate_keyset(qs, cursor, page_size)
+    except InvalidCursor:
+        return Response({"status": False, "message": "Invalid cursor", "data": []}, status=400)
+    if not requests_list and not cursor:
         return Response({"status": False, "message": "No service requests found", "data": []}, status=404)
-    ser = ServiceRequestSerializer(qs, many=True, context={
-                                   'language': get_language(request)})
-    return Response({"status": True, "message": f"Successfully retrieved {qs.count()} service requests", "data": ser.data})
+    with timed('serialize'):
+        data = ServiceRequestSerializer(requests_list, many=True, context={
+                                        'language': language, 'fields': fields, 'omit': omit}).data
+    response = Response({"status": True, "message": f"Successfully retrieved {len(requests_list)} service requests",
+                         "data": data, "pagination": {"next": next_cursor, "previous": previous_cursor}})
+    patch_cache_control(response, private=True, no_cache=True)
+    return set_validators(response, etag, last_modified)
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([RegisterThrottle])
 def register_user(request):
     s = UserRegistrationSerializer(data=request.data)
     s.is_valid(raise_exception=True)
@@ -66,8 +184,8 @@ def register_user(request):
             "message": "This full_name already exists",
             "data": None
         }, status=400)
-        
-    Token.objects.filter(user=user).delete()
+
+    # A freshly created user has no tokens to clear
     token = Token.objects.create(user=user)
     return Response({
         "status": True,
@@ -83,6 +201,7 @@ def register_user(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginThrottle])
 def token_login(request):
     full_name = (request.data.get('full_name') or '').strip()
     phone_number = (request.data.get('phone_number') or '').strip()
@@ -94,11 +213,14 @@ def token_login(request):
     except User.DoesNotExist:
         return Response({"status": False, "message": "Invalid credentials", "data": None}, status=401)
 
-    if not user.check_password(phone_number):
+    if not check_phone_credential(user, phone_number):
         return Response({"status": False, "message": "Invalid credentials", "data": None}, status=401)
 
-    Token.objects.filter(user=user).delete()
-    token = Token.objects.create(user=user)
+    if getattr(settings, 'LOGIN_REUSE_TOKEN', False):
+        token, _ = Token.objects.get_or_create(user=user)
+    else:
+        Token.objects.filter(user=user).delete()
+        token = Token.objects.create(user=user)
     return Response({"status": True, "message": "Login successful", "data": {
         "id": user.id, "full_name": user.full_name, "phone_number": user.phone_number, "token": token.key
     }}, status=200)
@@ -113,24 +235,130 @@ def token_logout(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([OrderThrottle])
 def create_service_request(request):
-    ser = ServiceRequestSerializer(
-        data=request.data,
-        context={'request': request, 'language': get_language(request)}
-    )
-    ser.is_valid(raise_exception=True)
-    obj = ser.save(user=request.user)
-
-    # 🔔 Send Telegram notification (non-blocking if it fails)
+    """
+    Create a service request. A client that may retry (flaky mobile
+    networks) sends an ``Idempotency-Key`` header: retries with the same
+    key and body get the first response back, with
+    ``Idempotent-Replayed: true``, instead of creating a second order.
+    """
+    language = get_language(request)
+    payload = request.data
     try:
-        send_new_service_request_notification(obj)
-    except Exception as e:
-        # Don't break the API for notification failures
-        print(
-            f"[Notification] Error while sending service request notification: {e}")
+        body, status_code, replayed = run_idempotent(
+            request.user, request.headers.get('Idempotency-Key'), payload,
+            lambda record: create_one_service_request(request.user, payload, language, record))
+    except IdempotencyError as e:
+        return Response({"status": False, "message": str(e), "data": None}, status=e.status_code, headers=e.headers)
+    response = Response(body, status=status_code)
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([OrderThrottle])
+def create_service_requests_batch(request):
+    """
+    Create many service requests in one call. Accepts a JSON list (or
+    ``{"requests": [...]}``); valid items are written together and every
+    item gets its own result.
+    """
+    items = request.data.get('requests') if isinstance(request.data, dict) else request.data
+    max_items = getattr(settings, 'SERVICE_REQUEST_BATCH_MAX', 100)
+    if not isinstance(items, list) or not items:
+        return Response({"status": False, "message": "A non-empty list of requests is required", "data": None}, status=400)
+    if len(items) > max_items:
+        return Response({"status": False, "message": f"At most {max_items} requests per batch", "data": None}, status=400)
+
+    language = get_language(request)
+    # Resolve every referenced service with one query for the whole batch
+    pks = set()
+    for item in items:
+        services = item.get('services') if isinstance(item, dict) else None
+        for pk in services if isinstance(services, list) else []:
+            try:
+                if not isinstance(pk, bool):
+                    pks.add(int(pk))
+            except (TypeError, ValueError):
+                pass
+    context = {'request': request, 'language': language, 'service_lookup': Service.objects.in_bulk(pks)}
+
+    results = [None] * len(items)
+    valid_indexes, valid_items = [], []
+    for index, item in enumerate(items):
+        ser = ServiceRequestSerializer(data=item, context=context)
+        if ser.is_valid():
+            valid_indexes.append(index)
+            valid_items.append(ser.validated_data)
+        else:
+            results[index] = {"index": index, "status": False, "errors": ser.errors}
+
+    created = bulk_create_service_requests(request.user, valid_items, language)
+    with timed('serialize'):
+        for index, obj in zip(valid_indexes, created):
+            results[index] = {
+                "index": index, "status": True,
+                "data": ServiceRequestSerializer(obj, context={'language': language}).data,
+            }
 
+    if len(created) == len(items):
+        code = status.HTTP_201_CREATED
+    elif created:
+        code = status.HTTP_207_MULTI_STATUS
+    else:
+        code = status.HTTP_400_BAD_REQUEST
     return Response({
-        "status": True,
-        "message": "Created",
-        "data": ServiceRequestSerializer(obj, context={'language': get_language(request)}).data
-    }, status=201)
+        "status": bool(created),
+        "message": f"Created {len(created)} of {len(items)} service requests",
+        "data": results,
+    }, status=code)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_service_requests(request, export_format):
+    """Stream service requests as CSV or JSONL (?from=, ?to=, ?services=1,2)"""
+    if export_format not in EXPORT_FORMATS:
+        return Response({"status": False, "message": f"Unknown export format: {export_format}", "data": None},
+                        status=404)
+    try:
+        queryset = export_queryset(
+            parse_bound(request.query_params.get('from')),
+            parse_bound(request.query_params.get('to'), end=True),
+            parse_service_ids(request.query_params.get('services')),
+        )
+    except InvalidExportFilter as e:
+        return Response({"status": False, "message": str(e), "data": None}, status=400)
+    content_type = 'text/csv; charset=utf-8' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(
+        iter_export(queryset, export_format, getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)),
+        content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="service-requests.{export_format}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def demand_analytics(request):
+    """Orders and distinct users per service per day, read from the daily rollup"""
+    try:
+        date_from = parse_date(request.query_params.get('from') or '1970-01-01')
+        date_to = parse_date(request.query_params.get('to') or '9999-12-31')
+        service_ids = parse_service_ids(request.query_params.get('services'))
+        if date_from is None or date_to is None:
+            raise ValueError
+    except ValueError:  # InvalidExportFilter is a ValueError too
+        return Response({"status": False, "message": "Invalid filter", "data": []}, status=400)
+    title_field = 'service__title_ar' if get_language(request) == 'ar' else 'service__title'
+    rows = ServiceDailyDemand.objects.filter(date__gte=date_from, date__lte=date_to)
+    if service_ids:
+        rows = rows.filter(service_id__in=service_ids)
+    data = [
+        {"date": row['date'], "service_id": row['service_id'], "service": row[title_field],
+         "orders": row['orders'], "distinct_users": row['distinct_users']}
+        for row in rows.values('date', 'service_id', title_field, 'orders', 'distinct_users')
+    ]
+    return Response({"status": True, "message": f"Retrieved {len(data)} rows", "data": data})
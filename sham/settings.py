@@ -34,7 +34,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # counts queries per request (X-Query-Count / Server-Timing headers)
+    'main.instrumentation.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # 503 + Retry-After once MAX_INFLIGHT_WRITES writes are running
+    'main.throttling.ConcurrencyLimitMiddleware',
+    # brotli/gzip by Accept-Encoding; catalog payloads are compressed once
+    'main.compression.CompressionMiddleware',
     # for serving static files in production
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',                # for enabling CORS
@@ -48,10 +54,47 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'sham.urls'
 
+# X-Query-Count / Server-Timing response headers expose internals; off
+# unless DEBUG (the bench commands turn them on for their own requests)
+SERVER_TIMING_HEADERS = config("SERVER_TIMING_HEADERS", default=DEBUG, cast=bool)
+# Per-view ORM query budgets (URL name -> max queries). Requests over budget
+# are logged; tests can enforce them with main.instrumentation helpers.
+QUERY_BUDGET_DEFAULT = None
+QUERY_BUDGETS = {
+    'service-list': 2,
+    'service-detail': 2,
+    'service-search': 1,
+    'service-sync': 2,
+    # includes 1 for the history validators (ETag / Last-Modified)
+    'list-service-requests': 4,
+    # includes 3 for the daily demand rollup and up to 6 for an
+    # Idempotency-Key: claiming and completing it, plus the failed insert,
+    # read and takeover when a previous use of the key has expired
+    'create-service-request': 19,
+    'create-service-requests-batch': 15,
+    # queries made while the body streams run after the middleware and aren't counted
+    'export-service-requests': 2,
+    'demand-analytics': 2,
+    'register-user': 6,
+    'token-login': 6,
+    'token-logout': 4,
+    'async-service-list': 2,
+    'async-service-detail': 2,
+    'async-list-service-requests': 4,
+    'async-create-service-request': 19,
+}
+
 
 # Telegram notification config
 TELEGRAM_BOT_TOKEN = config("TELEGRAM_BOT_TOKEN", default="")
 TELEGRAM_CHAT_ID = config("TELEGRAM_CHAT_ID", default="")
+TELEGRAM_API_URL = config("TELEGRAM_API_URL", default="https://api.telegram.org")
+
+# Notification outbox worker (python manage.py send_notifications)
+NOTIFICATION_WORKERS = config("NOTIFICATION_WORKERS", default=4, cast=int)
+NOTIFICATION_MAX_ATTEMPTS = config("NOTIFICATION_MAX_ATTEMPTS", default=5, cast=int)
+NOTIFICATION_RETRY_BACKOFF = 5  # seconds, doubled on each failed attempt
+NOTIFICATION_RETRY_BACKOFF_MAX = 600
 
 
 
@@ -89,6 +132,53 @@ DATABASES = {
     }
 }
 
+# Cache (locmem by default; point CACHE_BACKEND/CACHE_LOCATION at redis or
+# memcached to share it between workers)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='sham-default'),
+    }
+}
+
+# Rendered service catalog, invalidated on Service save/delete. Invalidation
+# only reaches every worker through a shared cache (redis/memcached); with
+# the per-process locmem default, other workers serve the old catalog (and
+# its ETags) until the timeout passes.
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = config("CATALOG_CACHE_TIMEOUT", default=300, cast=int)  # seconds
+
+# Token -> user cache used by CachedTokenAuthentication. Leave the alias empty
+# for a per-process LRU, or name a shared cache (redis/memcached) so logouts
+# are seen by every worker.
+TOKEN_AUTH_CACHE_ALIAS = config('TOKEN_AUTH_CACHE_ALIAS', default='')
+TOKEN_AUTH_CACHE_SIZE = 10000
+TOKEN_AUTH_CACHE_TTL = 300  # seconds
+
+# Response compression (main.compression.CompressionMiddleware)
+COMPRESS_MIN_SIZE = 512  # bytes
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # used when the brotli package is installed
+
+# Load shedding. Token buckets ("N/period": bursts of N, refilled over
+# the period) per IP for register/login and per user for order creation.
+THROTTLE_CACHE_ALIAS = 'default'  # point at a shared cache to throttle across processes
+THROTTLE_RATES = {
+    'register': config("THROTTLE_REGISTER_RATE", default="10/min"),
+    'login': config("THROTTLE_LOGIN_RATE", default="30/min"),
+    'order': config("THROTTLE_ORDER_RATE", default="20/min"),
+}
+# Per process, not global: a sync worker serves one request at a time, so
+# under plain WSGI the cap is the worker count. Set it for ASGI or threaded
+# workers, where one process runs many writes at once. 0 disables.
+MAX_INFLIGHT_WRITES = config("MAX_INFLIGHT_WRITES", default=32, cast=int)
+WRITE_RETRY_AFTER = 1  # seconds
+
+# Idempotency-Key on order creation (main.idempotency)
+IDEMPOTENCY_TTL = 24 * 3600  # seconds a stored response is replayed for
+IDEMPOTENCY_WAIT = 5  # seconds a duplicate waits for the first request before a 409
+IDEMPOTENCY_LOCK_TIMEOUT = 60  # seconds after which an unfinished claim is considered abandoned
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -97,6 +187,22 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'main.hashers.PhoneHMACPasswordHasher',
+]
+
+# Hasher for the phone-number credential of app users ('default' keeps
+# PBKDF2). Existing users are migrated on their next login.
+LOGIN_CREDENTIAL_HASHER = config('LOGIN_CREDENTIAL_HASHER', default='phone_hmac_sha256')
+PHONE_CREDENTIAL_KEY = config('PHONE_CREDENTIAL_KEY', default='')  # falls back to SECRET_KEY
+# Hand back the user's existing token on login instead of rotating it
+LOGIN_REUSE_TOKEN = config('LOGIN_REUSE_TOKEN', default=False, cast=bool)
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -110,6 +216,22 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# Uploads are named by content hash and deduplicated
+DEFAULT_FILE_STORAGE = "main.storage.ContentHashedStorage"
+# Serve MEDIA_URL through main.media.serve_media (cache headers + Range).
+# Off in production unless a deployment opts in; the web server should map
+# /media/ itself.
+SERVE_MEDIA = config("SERVE_MEDIA", default=DEBUG, cast=bool)
+MEDIA_CACHE_MAX_AGE = 86400  # for legacy, non-hashed names
+
+# Resized renditions of Service.image (services/<name>__w<width>.webp)
+SERVICE_IMAGE_WIDTHS = (160, 320, 640)
+SERVICE_IMAGE_FORMAT = "WEBP"  # or "JPEG"
+SERVICE_IMAGE_QUALITY = 75
+
+# Catalog importer (import_services / add_initial_services)
+IMPORT_WORKERS = 8  # threads fetching and decoding images
+IMPORT_TIMEOUT = 10  # seconds per image download
 
 # CSRF
 CSRF_TRUSTED_ORIGINS = [
@@ -119,14 +241,41 @@ CSRF_TRUSTED_ORIGINS = [
 
 # JWT Settings
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        "main.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        "rest_framework.authentication.TokenAuthentication",
+        "main.authentication.CachedTokenAuthentication",
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         "rest_framework.permissions.IsAuthenticated",
-    )
+    ),
+    # Reverse proxies in front of the app. Throttles key on the client
+    # address they append to X-Forwarded-For; with 0 the header is ignored
+    # and REMOTE_ADDR is used, so clients can't pick their own bucket.
+    'NUM_PROXIES': config("NUM_PROXIES", default=0, cast=int),
 }
 
+# Cursor pagination for list endpoints (?page_size=, ?cursor=)
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+# Admin changelists use the planner's row estimate instead of COUNT(*)
+# for unfiltered tables at least this big
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Largest list accepted by service-request/batch/
+SERVICE_REQUEST_BATCH_MAX = 100
+
+# Streaming exports (exports/service-requests.csv|jsonl, export_service_requests)
+EXPORT_CHUNK_SIZE = 2000  # rows fetched per query
+
+# Catalog delta sync (services/sync/)
+SYNC_PAGE_SIZE = 500
+SYNC_OVERLAP_SECONDS = 2  # changes this recent are sent again on the next sync
+SYNC_TOMBSTONE_RETENTION_DAYS = 30  # older sync tokens get a full reset
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=3650),  # 10 years
     'BLACKLIST_AFTER_ROTATION': True,